@@ -0,0 +1,106 @@
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+import numpy as np
+from BlackScholes.main import _as_float_arrays, _is_call
+
+#### Lattice pricing
+# Binomial (Cox-Ross-Rubinstein) and trinomial (Boyle) trees for American
+# and European options. S, K, T, r, sig and kind broadcast to a vector of m
+# options that share n_steps; the tree for all of them is held as one
+# (m, nodes) array and each backward-induction step is a whole-layer NumPy
+# operation. Delta, gamma and theta are read off the early layers of the
+# same tree, so they cost nothing extra. Theta is scaled by 0.01 to match
+# main.greeks.
+#
+# Returns a dict of arrays: price, delta, gamma, theta.
+def lattice_price(S, K, T, r, sig, kind, n_steps=200, american=True, method='binomial'):
+    if method == 'binomial':
+        return _binomial(S, K, T, r, sig, kind, n_steps, american)
+    if method == 'trinomial':
+        return _trinomial(S, K, T, r, sig, kind, n_steps, american)
+    raise ValueError("Unknown lattice method: " + str(method))
+
+def _as_columns(S, K, T, r, sig, kind):
+    arrays = np.broadcast_arrays(*_as_float_arrays(S, K, T, r, sig), _is_call(kind))
+    shape = arrays[0].shape
+    return shape, [np.ravel(array)[:, None] for array in arrays]
+
+def _intrinsic(nodes, K, is_call):
+    return np.where(is_call, np.maximum(nodes - K, 0.), np.maximum(K - nodes, 0.))
+
+def _binomial(S, K, T, r, sig, kind, n_steps, american):
+    n_steps = max(n_steps, 3)
+    shape, (S, K, T, r, sig, is_call) = _as_columns(S, K, T, r, sig, kind)
+    dt = T / n_steps
+    u = np.exp(sig * np.sqrt(dt))
+    discount = np.exp(-r * dt)
+    p = (np.exp(r * dt) - 1 / u) / (u - 1 / u)
+
+    # Every node price is S * u**k for some -n_steps <= k <= n_steps; the
+    # nodes of step i are every other one of those from -i to i.
+    node_prices = S * u**np.arange(-n_steps, n_steps + 1)
+    values = _intrinsic(node_prices[:, ::2], K, is_call)
+
+    layers = dict()
+    for step in range(n_steps - 1, -1, -1):
+        values = discount * (p * values[:, 1:] + (1 - p) * values[:, :-1])
+        if american:
+            nodes = node_prices[:, n_steps - step:n_steps + step + 1:2]
+            values = np.maximum(values, _intrinsic(nodes, K, is_call))
+        if step <= 2:
+            layers[step] = values
+
+    # Greeks from layers 1 and 2.
+    S = S[:, 0]
+    u = u[:, 0]
+    V1, V2 = layers[1], layers[2]
+    delta = (V1[:, 1] - V1[:, 0]) / (S * u - S / u)
+    up_delta = (V2[:, 2] - V2[:, 1]) / (S * u**2 - S)
+    down_delta = (V2[:, 1] - V2[:, 0]) / (S - S / u**2)
+    gamma = (up_delta - down_delta) / (0.5 * (S * u**2 - S / u**2))
+    theta = 0.01 * (V2[:, 1] - layers[0][:, 0]) / (2 * dt[:, 0])
+
+    return {'price': layers[0][:, 0].reshape(shape),
+            'delta': delta.reshape(shape),
+            'gamma': gamma.reshape(shape),
+            'theta': theta.reshape(shape)}
+
+def _trinomial(S, K, T, r, sig, kind, n_steps, american):
+    n_steps = max(n_steps, 2)
+    shape, (S, K, T, r, sig, is_call) = _as_columns(S, K, T, r, sig, kind)
+    dt = T / n_steps
+    u = np.exp(sig * np.sqrt(2 * dt))
+    discount = np.exp(-r * dt)
+    a = np.exp(r * dt / 2)
+    b = np.exp(sig * np.sqrt(dt / 2))
+    pu = ((a - 1 / b) / (b - 1 / b))**2
+    pd = ((b - a) / (b - 1 / b))**2
+    pm = 1 - pu - pd
+
+    # The nodes of step i are S * u**k for -i <= k <= i.
+    node_prices = S * u**np.arange(-n_steps, n_steps + 1)
+    values = _intrinsic(node_prices, K, is_call)
+
+    layers = dict()
+    for step in range(n_steps - 1, -1, -1):
+        values = discount * (pu * values[:, 2:] + pm * values[:, 1:-1] + pd * values[:, :-2])
+        if american:
+            nodes = node_prices[:, n_steps - step:n_steps + step + 1]
+            values = np.maximum(values, _intrinsic(nodes, K, is_call))
+        if step <= 1:
+            layers[step] = values
+
+    # Greeks from layer 1.
+    S = S[:, 0]
+    u = u[:, 0]
+    V1 = layers[1]
+    delta = (V1[:, 2] - V1[:, 0]) / (S * u - S / u)
+    up_delta = (V1[:, 2] - V1[:, 1]) / (S * u - S)
+    down_delta = (V1[:, 1] - V1[:, 0]) / (S - S / u)
+    gamma = (up_delta - down_delta) / (0.5 * (S * u - S / u))
+    theta = 0.01 * (V1[:, 1] - layers[0][:, 0]) / dt[:, 0]
+
+    return {'price': layers[0][:, 0].reshape(shape),
+            'delta': delta.reshape(shape),
+            'gamma': gamma.reshape(shape),
+            'theta': theta.reshape(shape)}
@@ -1,7 +1,7 @@
 
 
 from math import log, sqrt, pi, exp
-from stats import norm
+from scipy.stats import norm
 from datetime import datetime, date
 import numpy as np
 import pandas as pd
@@ -13,72 +13,260 @@ def d2(S,K,T,r,sig):
     return d1(S,K,T,r,sig)-sig*sqrt(T)
 
 def bs_call(S, K, T, r, sig):
-    return S * norm.cdf(d1(S, K, T, r, sig)) - K * exp(-r * T) * norm.cdf(d2(S, K, T, r, sig))
+    return S * _norm_cdf(d1(S, K, T, r, sig)) - K * exp(-r * T) * _norm_cdf(d2(S, K, T, r, sig))
 
 def bs_put(S, K, T, r, sig):
-    return K * exp(-r * T) - S * bs_call(S, K, T, r, sig)
+    return K * exp(-r * T) - S + bs_call(S, K, T, r, sig)
+
+#### Normal distribution backends
+# Every price and greek goes through _norm_cdf/_norm_pdf. The 'exact' backend
+# is scipy's norm. The 'fast' backend evaluates the Abramowitz & Stegun
+# 26.2.17 rational approximation directly in NumPy; its maximum absolute
+# error is 7.5e-8 (CDF_FAST_MAX_ABS_ERROR), which moves a price by at most
+# about 7.5e-8 * (S + K). The pdf is exact under both backends.
+CDF_FAST_MAX_ABS_ERROR = 7.5e-8
+_CDF_BACKENDS = ('exact', 'fast')
+_cdf_backend = 'exact'
+
+def set_cdf_backend(backend):
+    global _cdf_backend
+    if backend not in _CDF_BACKENDS:
+        raise ValueError("Unknown cdf backend: " + str(backend))
+    _cdf_backend = backend
+
+def get_cdf_backend():
+    return _cdf_backend
+
+_AS_P = 0.2316419
+_AS_B = (0.319381530, -0.356563782, 1.781477937, -1.821255978, 1.330274429)
+
+def _fast_norm_pdf(x):
+    x = np.asarray(x, dtype=np.float64)
+    return np.exp(-0.5 * x * x) / sqrt(2 * pi)
+
+def _fast_norm_cdf(x):
+    x = np.asarray(x, dtype=np.float64)
+    t = 1. / (1. + _AS_P * np.abs(x))
+    b1, b2, b3, b4, b5 = _AS_B
+    tail = _fast_norm_pdf(x) * t * (b1 + t * (b2 + t * (b3 + t * (b4 + t * b5))))
+    return np.where(x >= 0, 1. - tail, tail)
+
+def _norm_cdf(x):
+    if _cdf_backend == 'fast':
+        return _fast_norm_cdf(x)
+    return norm.cdf(x)
+
+def _norm_pdf(x):
+    if _cdf_backend == 'fast':
+        return _fast_norm_pdf(x)
+    return norm.pdf(x)
+
+#### Vectorized pricing
+# Array versions of d1/d2/bs_call/bs_put. S, K, T, r and sig can be NumPy
+# arrays or scalars and are broadcast against each other, so a whole chain
+# (or many chains) is priced in one call instead of a Python loop.
+def _as_float_arrays(*args):
+    return [np.asarray(arg, dtype=np.float64) for arg in args]
+
+def d1_vec(S, K, T, r, sig):
+    S, K, T, r, sig = _as_float_arrays(S, K, T, r, sig)
+    return (np.log(S/K)+((r+sig**2/2.)*T))/(sig*np.sqrt(T))
+def d2_vec(S, K, T, r, sig):
+    S, K, T, r, sig = _as_float_arrays(S, K, T, r, sig)
+    return d1_vec(S, K, T, r, sig)-sig*np.sqrt(T)
+
+def bs_call_vec(S, K, T, r, sig):
+    S, K, T, r, sig = _as_float_arrays(S, K, T, r, sig)
+    D1 = d1_vec(S, K, T, r, sig)
+    D2 = D1 - sig * np.sqrt(T)
+    return S * _norm_cdf(D1) - K * np.exp(-r * T) * _norm_cdf(D2)
+
+def bs_put_vec(S, K, T, r, sig):
+    S, K, T, r, sig = _as_float_arrays(S, K, T, r, sig)
+    D1 = d1_vec(S, K, T, r, sig)
+    D2 = D1 - sig * np.sqrt(T)
+    return K * np.exp(-r * T) * _norm_cdf(-D2) - S * _norm_cdf(-D1)
+
+# kind is 'call'/'put' (or 'c'/'p'), either a single string or an array
+# with one entry per option, for chains that mix calls and puts. A boolean
+# array is taken as an is-call flag.
+def bs_price_vec(S, K, T, r, sig, kind):
+    is_call = _is_call(kind)
+    return np.where(is_call, bs_call_vec(S, K, T, r, sig), bs_put_vec(S, K, T, r, sig))
+
+def _is_call(kind):
+    kind = np.asarray(kind)
+    if kind.dtype == np.bool_:
+        return kind
+    first_letter = kind.astype('U1')
+    return (first_letter == 'c') | (first_letter == 'C')
 
 #### Implied Volatility
+# Per-option status codes returned by implied_volatility_vec.
+IV_CONVERGED = 0
+IV_BELOW_INTRINSIC = 1  # Price is below the no-arbitrage lower bound.
+IV_ABOVE_MAXIMUM = 2    # Price is at or above the no-arbitrage upper bound.
+IV_NOT_CONVERGED = 3    # Hit max_iter without meeting the tolerance.
+
+# Safeguarded Newton solver over whole arrays of options. Each option keeps
+# a [low, high] bracket on sigma; a Newton step that leaves the bracket (or
+# has a vanishing vega) is replaced by bisection, so every option converges.
+# Options drop out of the working set as soon as they converge.
+# sig_guess optionally warm-starts the solve (scalar or per-option array,
+# NaN where there is no guess); the Brenner-Subrahmanyam estimate is used
+# otherwise. A guess near the answer typically saves several iterations.
+# Returns (iv, status); iv is NaN wherever status != IV_CONVERGED. With
+# return_iterations, also returns the per-option iteration count.
+def implied_volatility_vec(Price, S, K, T, r, kind, tol=1e-8, max_iter=100,
+                           sig_low=1e-6, sig_high=10., sig_guess=None,
+                           return_iterations=False):
+    arrays = np.broadcast_arrays(*_as_float_arrays(Price, S, K, T, r), _is_call(kind))
+    shape = arrays[0].shape
+    Price, S, K, T, r, is_call = [np.ravel(arg) for arg in arrays]
+
+    # No-arbitrage bounds.
+    discounted_K = K * np.exp(-r * T)
+    lower_bound = np.where(is_call, np.maximum(S - discounted_K, 0.), np.maximum(discounted_K - S, 0.))
+    upper_bound = np.where(is_call, S, discounted_K)
+
+    iv = np.full(Price.shape, np.nan)
+    status = np.full(Price.shape, IV_NOT_CONVERGED, dtype=np.int8)
+    status[Price < lower_bound] = IV_BELOW_INTRINSIC
+    status[Price >= upper_bound] = IV_ABOVE_MAXIMUM
+
+    # Starting point (the guess, else Brenner-Subrahmanyam), clipped into the bracket.
+    active = np.flatnonzero(status == IV_NOT_CONVERGED)
+    low = np.full(active.shape, sig_low)
+    high = np.full(active.shape, sig_high)
+    sig = np.sqrt(2 * pi / T[active]) * Price[active] / S[active]
+    if sig_guess is not None:
+        guess = np.ravel(np.broadcast_to(np.asarray(sig_guess, dtype=np.float64), shape))[active]
+        sig = np.where(np.isnan(guess), sig, guess)
+    sig = np.clip(sig, sig_low, sig_high)
+
+    iterations = np.zeros(Price.shape, dtype=np.int32)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        iterations[active] += 1
+        s, k, t, rate, call = S[active], K[active], T[active], r[active], is_call[active]
+        D1 = d1_vec(s, k, t, rate, sig)
+        price = np.where(call, bs_call_vec(s, k, t, rate, sig), bs_put_vec(s, k, t, rate, sig))
+        diff = price - Price[active]
+
+        # Price is increasing in sigma, so tighten the bracket.
+        high = np.where(diff > 0, sig, high)
+        low = np.where(diff < 0, sig, low)
+
+        done = (np.abs(diff) < tol) | (high - low < tol)
+        iv[active[done]] = sig[done]
+        status[active[done]] = IV_CONVERGED
+
+        # Newton step, falling back to bisection outside the bracket.
+        vega = s * _norm_pdf(D1) * np.sqrt(t)
+        with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+            newton = sig - diff / vega
+        in_bracket = (newton > low) & (newton < high) & (vega > 1e-12)
+        sig = np.where(in_bracket, newton, 0.5 * (low + high))
+
+        keep = ~done
+        active, sig, low, high = active[keep], sig[keep], low[keep], high[keep]
+
+    if return_iterations:
+        return iv.reshape(shape), status.reshape(shape), iterations.reshape(shape)
+    return iv.reshape(shape), status.reshape(shape)
+
+# Scalar wrappers. Return None if no volatility reproduces Price.
 def call_implied_volatility(Price, S, K, T, r):
-    sig = 0.001
-    while sig < 1:
-        Price_implied = S * \
-            norm.cdf(d1(S, K, T, r, sig))-K*exp(-r*T) * \
-            norm.cdf(d2(S, K, T, r, sig))
-        if Price-(Price_implied) < 0.001:
-            return sig
-        sig += 0.001
-    return "Not Found"
+    iv, status = implied_volatility_vec(Price, S, K, T, r, 'c')
+    return float(iv) if status == IV_CONVERGED else None
 
 def put_implied_volatility(Price, S, K, T, r):
-    sig = 0.001
-    while sig < 1:
-        Price_implied = K*exp(-r*T)-S+bs_call(S, K, T, r, sig)
-        if Price-(Price_implied) < 0.001:
-            return sig
-        sigma += 0.001
-    return "Not Found"
-
-print("Implied Volatility: " +
-      str(100 * call_implied_volatility(bs_call(lcp, strike_price, t, uty, sig,), lcp, strike_price, t, uty,)) + " %")
+    iv, status = implied_volatility_vec(Price, S, K, T, r, 'p')
+    return float(iv) if status == IV_CONVERGED else None
 
 ####CALL greeks
 def call_delta(S, K, T, r, sig):
-    return norm.cdf(d1(S, K, T, r, sig))
+    return _norm_cdf(d1(S, K, T, r, sig))
 
 def call_gamma(S, K, T, r, sig):
-    return norm.pdf(d1(S, K, T, r, sig)) / (S * sig * sqrt(T))
+    return _norm_pdf(d1(S, K, T, r, sig)) / (S * sig * sqrt(T))
 
 
 def call_vega(S, K, T, r, sig):
-    return 0.01 * (S * norm.pdf(d1(S, K, T, r, sigma)) * sqrt(T))
+    return 0.01 * (S * _norm_pdf(d1(S, K, T, r, sig)) * sqrt(T))
 
 
 def call_theta(S, K, T, r, sig):
-    return 0.01 * (-(S * norm.pdf(d1(S, K, T, r, sig)) * sig) / (2 * sqrt(T)) - r * K * exp(-r * T) * norm.cdf(
+    return 0.01 * (-(S * _norm_pdf(d1(S, K, T, r, sig)) * sig) / (2 * sqrt(T)) - r * K * exp(-r * T) * _norm_cdf(
         d2(S, K, T, r, sig)))
 
 
 def call_rho(S, K, T, r, sig):
-    return 0.01 * (K * T * exp(-r * T) * norm.cdf(d2(S, K, T, r, sig)))
+    return 0.01 * (K * T * exp(-r * T) * _norm_cdf(d2(S, K, T, r, sig)))
 
 ####PUT greeks
 def put_delta(S, K, T, r, sig):
-    return -norm.cdf(-d1(S, K, T, r, sig))
+    return -_norm_cdf(-d1(S, K, T, r, sig))
 
 
 def put_gamma(S, K, T, r, sig):
-    return norm.pdf(d1(S, K, T, r, sigma)) / (S * sig * sqrt(T))
+    return _norm_pdf(d1(S, K, T, r, sig)) / (S * sig * sqrt(T))
 
 
 def put_vega(S, K, T, r, sig):
-    return 0.01 * (S * norm.pdf(d1(S, K, T, r, sig)) * sqrt(T))
+    return 0.01 * (S * _norm_pdf(d1(S, K, T, r, sig)) * sqrt(T))
 
 
 def put_theta(S, K, T, r, sig):
-    return 0.01 * (-(S * norm.pdf(d1(S, K, T, r, sigma)) * sigma) / (2 * sqrt(T)) + r * K * exp(-r * T) * norm.cdf(
+    return 0.01 * (-(S * _norm_pdf(d1(S, K, T, r, sig)) * sig) / (2 * sqrt(T)) + r * K * exp(-r * T) * _norm_cdf(
         -d2(S, K, T, r, sig)))
 
 
 def put_rho(S, K, T, r, sig):
-    return 0.01 * (-K * T * exp(-r * T) * norm.cdf(-d2(S, K, T, r, sig)))
+    return 0.01 * (-K * T * exp(-r * T) * _norm_cdf(-d2(S, K, T, r, sig)))
+
+
+#### Batched greeks
+# All greeks for whole arrays of options in one pass. d1, d2, pdf(d1) and
+# the cdfs are computed once per option and shared by every greek; kind
+# ('call'/'put' or 'c'/'p', scalar or per-option array) picks the call or
+# put formula. Scaling matches the scalar functions above (vega, theta and
+# rho are multiplied by 0.01). Returns a dict of arrays.
+def greeks(S, K, T, r, sig, kind):
+    S, K, T, r, sig, is_call = np.broadcast_arrays(*_as_float_arrays(S, K, T, r, sig), _is_call(kind))
+
+    # Shared terms.
+    sqrt_T = np.sqrt(T)
+    D1 = (np.log(S/K)+((r+sig**2/2.)*T))/(sig*sqrt_T)
+    D2 = D1 - sig * sqrt_T
+    pdf_D1 = _norm_pdf(D1)
+    cdf_D1 = _norm_cdf(D1)
+    cdf_D2 = _norm_cdf(D2)
+    discounted_K = K * np.exp(-r * T)
+
+    # Puts use N(-x) = 1 - N(x).
+    gamma = pdf_D1 / (S * sig * sqrt_T)
+    vega = 0.01 * (S * pdf_D1 * sqrt_T)
+    time_decay = -(S * pdf_D1 * sig) / (2 * sqrt_T)
+    return {
+        'price': np.where(is_call,
+                          S * cdf_D1 - discounted_K * cdf_D2,
+                          discounted_K * (1 - cdf_D2) - S * (1 - cdf_D1)),
+        'delta': np.where(is_call, cdf_D1, cdf_D1 - 1),
+        'gamma': gamma,
+        'vega': vega,
+        'theta': np.where(is_call,
+                          0.01 * (time_decay - r * discounted_K * cdf_D2),
+                          0.01 * (time_decay + r * discounted_K * (1 - cdf_D2))),
+        'rho': np.where(is_call,
+                        0.01 * (T * discounted_K * cdf_D2),
+                        0.01 * (-T * discounted_K * (1 - cdf_D2))),
+    }
+
+
+if __name__ == "__main__":
+    # Example inputs.
+    lcp, strike_price, t, uty, sig = 100.0, 100.0, 0.5, 0.011, 0.25
+    print("Implied Volatility: " +
+          str(100 * call_implied_volatility(bs_call(lcp, strike_price, t, uty, sig,), lcp, strike_price, t, uty,)) + " %")
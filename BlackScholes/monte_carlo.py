@@ -0,0 +1,128 @@
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+import time
+import numpy as np
+from BlackScholes.main import bs_call_vec, bs_put_vec, _is_call
+
+PAYOFFS = ('european', 'asian', 'barrier')
+BARRIER_TYPES = ('down-and-out', 'down-and-in', 'up-and-out', 'up-and-in')
+
+#### Monte Carlo pricing
+# Simulates GBM paths in chunks of chunk_size so memory stays at about
+# chunk_size * n_steps floats however many paths are requested. Only running
+# sums are kept between chunks.
+#
+# payoff:
+#   'european' - max(S_T - K, 0) / max(K - S_T, 0)
+#   'asian'    - arithmetic average of the n_steps monitoring prices vs. K
+#   'barrier'  - european payoff, knocked out/in when the discretely
+#                monitored path crosses barrier (see BARRIER_TYPES)
+#
+# antithetic pairs every normal draw Z with -Z and averages the pair, so
+# every sample is a pair; an odd n_paths is rounded up to whole pairs (the
+# returned n_paths is the number actually simulated).
+# control_variate regresses on a control with a known mean: the discounted
+# terminal price (mean S) for european payoffs, and the vanilla european
+# option (mean bs_call/bs_put) for path-dependent ones.
+#
+# Returns a dict with price, std_error, n_paths, elapsed and paths_per_second.
+def monte_carlo_price(S, K, T, r, sig, kind='call', payoff='european',
+                      n_paths=1000000, n_steps=252, chunk_size=20000,
+                      antithetic=True, control_variate=True,
+                      barrier=None, barrier_type='down-and-out', seed=None):
+
+    if payoff not in PAYOFFS:
+        raise ValueError("Unknown payoff: " + str(payoff))
+    if payoff == 'barrier':
+        if barrier == None:
+            raise ValueError("A barrier payoff needs a barrier level.")
+        if barrier_type not in BARRIER_TYPES:
+            raise ValueError("Unknown barrier type: " + str(barrier_type))
+    if payoff == 'european':
+        n_steps = 1
+
+    is_call = bool(_is_call(kind))
+    rng = np.random.default_rng(seed)
+    dt = T / n_steps
+    drift = (r - sig**2 / 2.) * dt
+    diffusion = sig * np.sqrt(dt)
+    discount = np.exp(-r * T)
+
+    # Known mean of the control.
+    if payoff == 'european':
+        control_mean = S
+    elif is_call:
+        control_mean = float(bs_call_vec(S, K, T, r, sig))
+    else:
+        control_mean = float(bs_put_vec(S, K, T, r, sig))
+
+    # Running sums of the payoff y and the control x.
+    n_samples = 0
+    sum_y = sum_x = sum_yy = sum_xx = sum_xy = 0.
+
+    start_time = time.perf_counter()
+    draws_per_sample = 2 if antithetic else 1
+    n_paths += -n_paths % draws_per_sample
+    paths_done = 0
+    while paths_done < n_paths:
+        samples = max(min(chunk_size, n_paths - paths_done) // draws_per_sample, 1)
+        Z = rng.standard_normal((samples, n_steps))
+
+        y, x = _simulate(S, K, is_call, payoff, barrier, barrier_type, drift, diffusion, discount, Z)
+        if antithetic:
+            y_anti, x_anti = _simulate(S, K, is_call, payoff, barrier, barrier_type,
+                                       drift, diffusion, discount, -Z)
+            y = (y + y_anti) / 2
+            x = (x + x_anti) / 2
+
+        n_samples += samples
+        sum_y += y.sum()
+        sum_x += x.sum()
+        sum_yy += (y * y).sum()
+        sum_xx += (x * x).sum()
+        sum_xy += (x * y).sum()
+        paths_done += samples * draws_per_sample
+    elapsed = time.perf_counter() - start_time
+
+    # Sample moments.
+    mean_y = sum_y / n_samples
+    mean_x = sum_x / n_samples
+    denominator = max(n_samples - 1, 1)
+    var_y = (sum_yy - n_samples * mean_y**2) / denominator
+    var_x = (sum_xx - n_samples * mean_x**2) / denominator
+    cov_xy = (sum_xy - n_samples * mean_x * mean_y) / denominator
+
+    price = mean_y
+    variance = var_y
+    if control_variate and var_x > 0:
+        beta = cov_xy / var_x
+        price = mean_y - beta * (mean_x - control_mean)
+        variance = var_y - cov_xy**2 / var_x
+
+    return {'price': float(price),
+            'std_error': float(np.sqrt(max(variance, 0.) / n_samples)),
+            'n_paths': paths_done,
+            'elapsed': elapsed,
+            'paths_per_second': paths_done / elapsed if elapsed > 0 else float('inf')}
+
+# Discounted payoff and control for one block of normal draws.
+def _simulate(S, K, is_call, payoff, barrier, barrier_type, drift, diffusion, discount, Z):
+    paths = S * np.exp(np.cumsum(drift + diffusion * Z, axis=1))
+    terminal = paths[:, -1]
+    vanilla = np.maximum(terminal - K, 0.) if is_call else np.maximum(K - terminal, 0.)
+
+    if payoff == 'european':
+        return discount * vanilla, discount * terminal
+
+    if payoff == 'asian':
+        average = paths.mean(axis=1)
+        payoffs = np.maximum(average - K, 0.) if is_call else np.maximum(K - average, 0.)
+    else:
+        if barrier_type.startswith('down'):
+            crossed = (paths <= barrier).any(axis=1) | (S <= barrier)
+        else:
+            crossed = (paths >= barrier).any(axis=1) | (S >= barrier)
+        alive = ~crossed if barrier_type.endswith('out') else crossed
+        payoffs = np.where(alive, vanilla, 0.)
+
+    return discount * payoffs, discount * vanilla
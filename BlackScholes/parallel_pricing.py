@@ -0,0 +1,75 @@
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from BlackScholes.main import bs_call_vec, bs_put_vec, _is_call, get_cdf_backend, set_cdf_backend
+
+# Below this many options the pool costs more than it saves.
+MIN_PARALLEL_SIZE = 100000
+DEFAULT_CHUNK_SIZE = 250000
+
+#### Parallel chain pricing
+# Inputs are broadcast, flattened and copied once into a shared-memory block
+# of shape (6, n): S, K, T, r, sig and a call flag. Workers attach to it and
+# to the output block by name and each prices a [start, end) slice, so no
+# option data is pickled. Each element goes through the same bs_call_vec /
+# bs_put_vec as the single-process path, so results are identical.
+def _price_chunk(input_name, output_name, n, start, end, cdf_backend):
+    set_cdf_backend(cdf_backend)
+    input_block = shared_memory.SharedMemory(name=input_name)
+    output_block = shared_memory.SharedMemory(name=output_name)
+    try:
+        inputs = np.ndarray((6, n), dtype=np.float64, buffer=input_block.buf)
+        output = np.ndarray((n,), dtype=np.float64, buffer=output_block.buf)
+        S, K, T, r, sig, call_flag = inputs[:, start:end]
+        is_call = call_flag > 0
+        prices = np.empty(end - start)
+        prices[is_call] = bs_call_vec(S[is_call], K[is_call], T[is_call], r[is_call], sig[is_call])
+        prices[~is_call] = bs_put_vec(S[~is_call], K[~is_call], T[~is_call], r[~is_call], sig[~is_call])
+        output[start:end] = prices
+        del inputs, output, S, K, T, r, sig, call_flag
+    finally:
+        input_block.close()
+        output_block.close()
+
+# Price a (possibly very large) set of options across a process pool.
+# Arguments broadcast like bs_price_vec; workers defaults to os.cpu_count().
+def price_chains_parallel(S, K, T, r, sig, kind, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    arrays = np.broadcast_arrays(*[np.asarray(arg, dtype=np.float64) for arg in (S, K, T, r, sig)],
+                                 _is_call(kind))
+    shape = arrays[0].shape
+    n = arrays[0].size
+    workers = workers or os.cpu_count() or 1
+    if n == 0:
+        return np.empty(shape)
+
+    input_block = shared_memory.SharedMemory(create=True, size=6 * n * 8)
+    output_block = shared_memory.SharedMemory(create=True, size=n * 8)
+    try:
+        inputs = np.ndarray((6, n), dtype=np.float64, buffer=input_block.buf)
+        for row, array in enumerate(arrays):
+            inputs[row] = np.ravel(array)
+        output = np.ndarray((n,), dtype=np.float64, buffer=output_block.buf)
+
+        chunks = [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+        if workers == 1 or len(chunks) == 1 or n < MIN_PARALLEL_SIZE:
+            for start, end in chunks:
+                _price_chunk(input_block.name, output_block.name, n, start, end, get_cdf_backend())
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_price_chunk, input_block.name, output_block.name,
+                                       n, start, end, get_cdf_backend())
+                           for start, end in chunks]
+                for future in futures:
+                    future.result()
+
+        prices = output.copy().reshape(shape)
+        del inputs, output
+        return prices
+    finally:
+        input_block.close()
+        input_block.unlink()
+        output_block.close()
+        output_block.unlink()
@@ -0,0 +1,100 @@
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+import math
+import threading
+from collections import OrderedDict
+from BlackScholes import main
+
+# Functions with the (S, K, T, r, sig) signature that cached() wraps.
+CACHEABLE_FUNCTIONS = ('bs_call', 'bs_put',
+                       'call_delta', 'call_gamma', 'call_vega', 'call_theta', 'call_rho',
+                       'put_delta', 'put_gamma', 'put_vega', 'put_theta', 'put_rho')
+
+# Rough per-entry overhead of the OrderedDict node, on top of key and value.
+_ENTRY_OVERHEAD_BYTES = 100
+
+#### Pricing cache
+# Memoizes scalar pricing functions on quantized inputs. Each of S, K, T, r
+# and sig is snapped to within a relative tolerance of itself (its binary
+# mantissa rounded to a multiple of tolerance) and the function is evaluated
+# at the snapped point, so every call that lands in the same cell gets the
+# same answer whatever the call order. Snapping keeps the sign and never
+# turns a nonzero input into 0, so a short T or a small r or sig stays as
+# usable as it is unwrapped. Entries are evicted
+# least recently used first once their estimated size passes max_bytes.
+# Hit, miss and eviction counters tell whether caching pays off for a run.
+class PricingCache:
+
+    def __init__(self, tolerance=1e-6, max_bytes=64 * 1024 * 1024):
+        self.tolerance = tolerance
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    # (exponent, mantissa cell) of value; _snap is the inverse.
+    def _quantize(self, value):
+        mantissa, exponent = math.frexp(value)
+        return exponent, int(round(mantissa / self.tolerance))
+
+    def _snap(self, cell):
+        exponent, mantissa_cell = cell
+        return math.ldexp(mantissa_cell * self.tolerance, exponent)
+
+    def _entry_bytes(self, key, value):
+        return sys.getsizeof(key) + sum(sys.getsizeof(item) for item in key) + \
+            sys.getsizeof(value) + _ENTRY_OVERHEAD_BYTES
+
+    def get(self, func, S, K, T, r, sig):
+        cells = tuple(self._quantize(value) for value in (S, K, T, r, sig))
+        key = (func.__name__,) + tuple(item for cell in cells for item in cell)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = func(*(self._snap(cell) for cell in cells))
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = value
+                self.current_bytes += self._entry_bytes(key, value)
+                while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                    old_key, old_value = self._entries.popitem(last=False)
+                    self.current_bytes -= self._entry_bytes(old_key, old_value)
+                    self.evictions += 1
+        return value
+
+    # Returns a function with func's signature that goes through this cache.
+    def wrap(self, func):
+        def cached_func(S, K, T, r, sig):
+            return self.get(func, S, K, T, r, sig)
+        cached_func.__name__ = func.__name__
+        cached_func.__wrapped__ = func
+        return cached_func
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries),
+                    'bytes': self.current_bytes,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+# Returns a dict of cached versions of the main.py pricing and greek
+# functions, keyed by name, all sharing one PricingCache.
+def cached(cache=None):
+    cache = cache or PricingCache()
+    return {name: cache.wrap(getattr(main, name)) for name in CACHEABLE_FUNCTIONS}
@@ -0,0 +1,102 @@
+import csv
+import datetime
+import threading
+import numpy as np
+
+# Tenors of the columns of the Treasury daily par yield curve CSV, in years.
+TREASURY_TENORS = (('1 Mo', 1 / 12.), ('2 Mo', 2 / 12.), ('3 Mo', .25), ('4 Mo', 4 / 12.),
+                   ('6 Mo', .5), ('1 Yr', 1.), ('2 Yr', 2.), ('3 Yr', 3.), ('5 Yr', 5.),
+                   ('7 Yr', 7.), ('10 Yr', 10.), ('20 Yr', 20.), ('30 Yr', 30.))
+
+# Rates are cached per curve date for every whole day to expiration up to
+# this many days; longer maturities are interpolated on each lookup.
+MAX_CACHED_DAYS = 3 * 365
+
+#### Yield curve
+# Risk-free rates by date and maturity. Each curve date holds the yields at
+# a set of tenors; a lookup uses the latest curve date on or before the
+# requested date (the first one for earlier dates) and interpolates
+# linearly in maturity, flat beyond the first and last tenors. Yields are
+# stored as continuously compounded decimals, which is what Black-Scholes
+# takes.
+#
+# Lookups are vectorized over (date, years) pairs. The first lookup on a
+# curve date interpolates that date's rate for every whole day to
+# expiration up to MAX_CACHED_DAYS, and later lookups on the date are a
+# gather from that row.
+class YieldCurve:
+
+    # dates: sorted datetime.dates; tenors: years; rates: (dates, tenors)
+    # continuously compounded decimals, NaN where a tenor has no quote.
+    def __init__(self, dates, tenors, rates):
+        self.dates = np.array(dates, dtype='datetime64[D]')
+        self.tenors = np.asarray(tenors, dtype=np.float64)
+        self.rates = np.asarray(rates, dtype=np.float64)
+        self._rates_by_day = dict()
+        self._lock = threading.Lock()
+
+    # A curve from a Treasury daily par yield curve CSV (a Date column and
+    # one percent-yield column per tenor, any order of rows). Par yields
+    # are semiannual bond-equivalent yields; r = 2 * ln(1 + y / 2) turns
+    # them into continuously compounded rates.
+    @classmethod
+    def from_treasury_csv(cls, file_name):
+        rows = []
+        with open(file_name, newline='') as csv_file:
+            reader = csv.DictReader(csv_file)
+            columns = [(name, tenor) for name, tenor in TREASURY_TENORS if name in reader.fieldnames]
+            for row in reader:
+                data_date = _parse_date(row['Date'])
+                yields = [float(row[name]) / 100 if row[name] not in ('', None) else np.nan
+                          for name, tenor in columns]
+                if not np.isnan(yields).all():
+                    rows.append((data_date, yields))
+        if len(rows) == 0:
+            raise ValueError("No yield curve data in " + str(file_name))
+        rows.sort(key=lambda row: row[0])
+        return cls([row[0] for row in rows],
+                   [tenor for name, tenor in columns],
+                   2 * np.log1p(np.array([row[1] for row in rows]) / 2))
+
+    # Returns the rate for each (data_date, years_to_expiration) pair.
+    # Both broadcast; data_dates may be datetime.dates or datetime64s.
+    def get_rates(self, data_dates, years_to_expiration):
+        data_dates, years = np.broadcast_arrays(np.asarray(data_dates, dtype='datetime64[D]'),
+                                                np.asarray(years_to_expiration, dtype=np.float64))
+        curve_rows = np.maximum(np.searchsorted(self.dates, data_dates, side='right') - 1, 0)
+        days = np.rint(years * 365)
+        cached = (days >= 0) & (days <= MAX_CACHED_DAYS)
+
+        rates = np.empty(years.shape)
+        for curve_row in np.unique(curve_rows):
+            on_date = curve_rows == curve_row
+            hits = on_date & cached
+            rates[hits] = self._get_rates_by_day(curve_row)[days[hits].astype(np.int64)]
+            misses = on_date & ~cached
+            if misses.any():
+                rates[misses] = self._interpolate(curve_row, years[misses])
+        return rates
+
+    # Scalar form of get_rates.
+    def get_rate(self, data_date, years_to_expiration):
+        return float(self.get_rates(data_date, years_to_expiration))
+
+    def _interpolate(self, curve_row, years):
+        quoted = ~np.isnan(self.rates[curve_row])
+        return np.interp(years, self.tenors[quoted], self.rates[curve_row][quoted])
+
+    def _get_rates_by_day(self, curve_row):
+        rates_by_day = self._rates_by_day.get(curve_row)
+        if rates_by_day is None:
+            rates_by_day = self._interpolate(curve_row, np.arange(MAX_CACHED_DAYS + 1) / 365)
+            with self._lock:
+                self._rates_by_day[curve_row] = rates_by_day
+        return rates_by_day
+
+def _parse_date(text):
+    for date_format in ('%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(text.strip(), date_format).date()
+        except ValueError:
+            pass
+    raise ValueError("Unrecognized date in yield curve file: " + str(text))
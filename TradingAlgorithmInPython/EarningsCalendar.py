@@ -0,0 +1,133 @@
+"""
+This class holds the earnings_dates table in memory, indexed
+both by symbol (earnings sorted by date) and by date (symbols
+reporting, with their before/after flags). Symbols are loaded
+on first use, one query each, or the whole table at once with
+load_all(). Lookups are a bisect or a dict access instead of a
+query per call.
+"""
+import bisect
+import threading
+import psycopg2
+import connection_pool
+
+class EarningsCalendar:
+
+    def __init__(self):
+        self._dates_by_symbol = dict()
+        self._data_by_symbol = dict()
+        self._symbols_by_date = dict()
+        self._loaded_all = False
+        self._lock = threading.RLock()
+
+    """Runs an earnings_dates query and returns the raw rows:
+       (underlying_symbol, earnings_date, earnings_estimate,
+       reported_earnings, before_or_after)."""
+    def _fetch(self, underlying_symbol=None):
+        connection = None
+        try:
+            connection = connection_pool.getconn()
+            cursor = connection.cursor()
+            query = """SELECT underlying_symbol, earnings_date, earnings_estimate,
+                       reported_earnings, before_or_after FROM earnings_dates"""
+            if underlying_symbol != None:
+                cursor.execute(query + " WHERE underlying_symbol=%s;", (underlying_symbol,))
+            else:
+                cursor.execute(query + ";")
+            earnings_tuples = cursor.fetchall()
+
+        except psycopg2.DatabaseError as e:
+            if connection:
+                connection.rollback()
+            raise
+
+        finally:
+            if connection:
+                connection_pool.putconn(connection)
+        return earnings_tuples
+
+    """Adds the rows of each symbol to the indexes, replacing whatever
+       was there for that symbol."""
+    def _index(self, earnings_tuples, symbols):
+        rows_by_symbol = {symbol: [] for symbol in symbols}
+        for row in earnings_tuples:
+            rows_by_symbol.setdefault(row[0], []).append(row)
+
+        for symbol, rows in rows_by_symbol.items():
+            for earnings_date in self._dates_by_symbol.get(symbol, []):
+                self._symbols_by_date[earnings_date] = [
+                    entry for entry in self._symbols_by_date[earnings_date] if entry[0] != symbol]
+            rows.sort(key=lambda row: row[1])
+            self._dates_by_symbol[symbol] = [row[1] for row in rows]
+            self._data_by_symbol[symbol] = [{'earnings_date': row[1],
+                                             'earnings_estimate': row[2],
+                                             'reported_earnings': row[3],
+                                             'before_or_after': row[4]} for row in rows]
+            for row in rows:
+                self._symbols_by_date.setdefault(row[1], []).append((symbol, row[4]))
+
+    """Loads the whole earnings_dates table."""
+    def load_all(self):
+        earnings_tuples = self._fetch()
+        with self._lock:
+            self._index(earnings_tuples, set(self._dates_by_symbol.keys()))
+            self._loaded_all = True
+
+    """Loads one symbol, if it is not loaded yet."""
+    def _load_symbol(self, underlying_symbol):
+        with self._lock:
+            if self._loaded_all or underlying_symbol in self._dates_by_symbol:
+                return
+        earnings_tuples = self._fetch(underlying_symbol)
+        with self._lock:
+            if underlying_symbol not in self._dates_by_symbol:
+                self._index(earnings_tuples, [underlying_symbol])
+
+    """Forget everything loaded, so the next lookups see new rows."""
+    def clear(self):
+        with self._lock:
+            self._dates_by_symbol.clear()
+            self._data_by_symbol.clear()
+            self._symbols_by_date.clear()
+            self._loaded_all = False
+
+    """Returns the earnings dates for this symbol, in order."""
+    def get_earnings_dates(self, underlying_symbol):
+        self._load_symbol(underlying_symbol)
+        with self._lock:
+            return list(self._dates_by_symbol.get(underlying_symbol, []))
+
+    """Returns the earnings data for this symbol, in date order, as dicts
+       of earnings_date, earnings_estimate, reported_earnings and
+       before_or_after."""
+    def get_earnings_data(self, underlying_symbol):
+        self._load_symbol(underlying_symbol)
+        with self._lock:
+            return [dict(row) for row in self._data_by_symbol.get(underlying_symbol, [])]
+
+    """Returns the first earnings date on or after current_date, or None."""
+    def get_next_earnings(self, underlying_symbol, current_date):
+        self._load_symbol(underlying_symbol)
+        with self._lock:
+            earnings_dates = self._dates_by_symbol.get(underlying_symbol, [])
+            index = bisect.bisect_left(earnings_dates, current_date)
+            return earnings_dates[index] if index < len(earnings_dates) else None
+
+    """Returns the earnings dates of this symbol from earliest_date to
+       latest_date inclusive, in order."""
+    def get_earnings_in_window(self, underlying_symbol, earliest_date, latest_date):
+        self._load_symbol(underlying_symbol)
+        with self._lock:
+            earnings_dates = self._dates_by_symbol.get(underlying_symbol, [])
+            return earnings_dates[bisect.bisect_left(earnings_dates, earliest_date):
+                                  bisect.bisect_right(earnings_dates, latest_date)]
+
+    """Returns (symbol, before_or_after) for every company reporting
+       on this date. Loads the whole table on first use."""
+    def get_symbols_reporting_on(self, earnings_date):
+        with self._lock:
+            loaded_all = self._loaded_all
+        if not loaded_all:
+            self.load_all()
+        with self._lock:
+            return list(self._symbols_by_date.get(earnings_date, []))
@@ -0,0 +1,147 @@
+"""
+This class represents the implied volatility surface
+of one underlying on one data date. IVs from the chain
+are laid on a strike-by-expiry grid once, and lookups
+at arbitrary (strike, expiry) points are bilinear
+interpolations on that grid.
+"""
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from collections import OrderedDict
+import numpy as np
+import load_trades
+from BlackScholes.main import implied_volatility_vec, IV_CONVERGED
+
+# Number of surfaces kept by get_iv_surface.
+MAX_CACHED_SURFACES = 256
+_surface_cache = OrderedDict()
+
+class IVSurface:
+
+    """Build the surface from a list of TransactionCandidates
+       for a single symbol and data date."""
+    def __init__(self, underlying_symbol, data_date, transaction_candidates):
+
+        self.underlying_symbol = underlying_symbol
+        self.data_date         = data_date
+
+        # Pull the columns we need out of the chain.
+        strikes = np.array([c.strike for c in transaction_candidates], dtype=np.float64)
+        years = np.array([self._get_years_to_expiration(c.expiration) for c in transaction_candidates],
+                         dtype=np.float64)
+        ivs = np.array([c.iv if c.iv else np.nan for c in transaction_candidates], dtype=np.float64)
+
+        # Solve the IVs that were not cached in one batch.
+        missing = np.flatnonzero(np.isnan(ivs))
+        if missing.size > 0:
+            chain = [transaction_candidates[i] for i in missing]
+            mids = [c.mid if c.mid != None else round((c.bid + c.ask)/2, 2) for c in chain]
+            solved, status = implied_volatility_vec(mids,
+                                                    [c.underlying_price for c in chain],
+                                                    strikes[missing],
+                                                    years[missing],
+                                                    [c.get_risk_free_rate() for c in chain],
+                                                    [c.option_type for c in chain])
+            ivs[missing] = np.where(status == IV_CONVERGED, solved, np.nan)
+
+        # Drop unusable points.
+        usable = np.isfinite(ivs) & (ivs > 0)
+        strikes, years, ivs = strikes[usable], years[usable], ivs[usable]
+        if ivs.size == 0:
+            raise ValueError("No usable IVs for " + str(underlying_symbol) + " on " + str(data_date))
+
+        # Average calls and puts that share a grid cell.
+        self.strikes, strike_index = np.unique(strikes, return_inverse=True)
+        self.years, years_index = np.unique(years, return_inverse=True)
+        totals = np.zeros((self.strikes.size, self.years.size))
+        counts = np.zeros((self.strikes.size, self.years.size))
+        np.add.at(totals, (strike_index, years_index), ivs)
+        np.add.at(counts, (strike_index, years_index), 1)
+        with np.errstate(invalid='ignore'):
+            grid = totals / counts
+
+        self.grid = self._fill_missing(grid)
+        self._calculate_coefficients()
+
+    """Returns the years to expiration, as in TransactionCandidate."""
+    def _get_years_to_expiration(self, expiration):
+        return max(round(float((expiration - self.data_date).days) / 365, 3), .001)
+
+    """Fill holes in the grid by linear interpolation, first along
+       strikes within each expiry, then along expiries."""
+    def _fill_missing(self, grid):
+        for j in range(grid.shape[1]):
+            known = ~np.isnan(grid[:, j])
+            if known.any() and not known.all():
+                grid[:, j] = np.interp(self.strikes, self.strikes[known], grid[known, j])
+        for i in range(grid.shape[0]):
+            known = ~np.isnan(grid[i, :])
+            if known.any() and not known.all():
+                grid[i, :] = np.interp(self.years, self.years[known], grid[i, known])
+        return grid
+
+    """Precompute f = a + b*x + c*y + d*x*y for every grid cell, with x and
+       y measured from the cell's lower corner. Axes with a single point
+       are treated as flat."""
+    def _calculate_coefficients(self):
+        grid = self.grid
+        if grid.shape[0] == 1:
+            grid = np.vstack([grid, grid])
+        if grid.shape[1] == 1:
+            grid = np.hstack([grid, grid])
+        strike_steps = np.diff(self.strikes) if self.strikes.size > 1 else np.ones(1)
+        years_steps = np.diff(self.years) if self.years.size > 1 else np.ones(1)
+
+        f00 = grid[:-1, :-1]
+        f10 = grid[1:, :-1]
+        f01 = grid[:-1, 1:]
+        f11 = grid[1:, 1:]
+        dx = strike_steps[:, None]
+        dy = years_steps[None, :]
+        self._a = f00
+        self._b = (f10 - f00) / dx
+        self._c = (f01 - f00) / dy
+        self._d = (f11 - f10 - f01 + f00) / (dx * dy)
+
+    """Returns the interpolated IV for arrays (or scalars) of strikes
+       and years to expiration. Points outside the grid are clamped to
+       its edges."""
+    def get_iv(self, strike, years_to_expiration):
+        strike, years = np.broadcast_arrays(np.asarray(strike, dtype=np.float64),
+                                            np.asarray(years_to_expiration, dtype=np.float64))
+        strike = np.clip(strike, self.strikes[0], self.strikes[-1])
+        years = np.clip(years, self.years[0], self.years[-1])
+
+        # Binary search for the cell.
+        i = np.clip(np.searchsorted(self.strikes, strike, side='right') - 1, 0, self._a.shape[0] - 1)
+        j = np.clip(np.searchsorted(self.years, years, side='right') - 1, 0, self._a.shape[1] - 1)
+        x = strike - self.strikes[i]
+        y = years - self.years[j]
+        return self._a[i, j] + self._b[i, j] * x + self._c[i, j] * y + self._d[i, j] * x * y
+
+    """Same as get_iv, with expiration dates instead of years."""
+    def get_iv_by_expiration(self, strike, expiration):
+        if isinstance(expiration, (list, tuple, np.ndarray)):
+            years = [self._get_years_to_expiration(e) for e in expiration]
+        else:
+            years = self._get_years_to_expiration(expiration)
+        return self.get_iv(strike, years)
+
+"""Returns the IVSurface for this symbol and date, building it from the
+   DB only the first time. The least recently used surfaces are dropped
+   once more than MAX_CACHED_SURFACES are held."""
+def get_iv_surface(underlying_symbol, data_date):
+
+    key = (underlying_symbol.upper(), data_date)
+    if key in _surface_cache:
+        _surface_cache.move_to_end(key)
+        return _surface_cache[key]
+
+    transaction_candidates = load_trades.get_transaction_candidates_by_date_and_symbol(
+        key[0], data_date, data_date, 0, calculate_greeks=False)
+    surface = IVSurface(key[0], data_date, transaction_candidates)
+
+    _surface_cache[key] = surface
+    if len(_surface_cache) > MAX_CACHED_SURFACES:
+        _surface_cache.popitem(last=False)
+    return surface
@@ -0,0 +1,335 @@
+"""
+This class holds option data for many options at once,
+one typed NumPy column per TransactionCandidate field,
+instead of one Python object per DB row. Filtering,
+sorting and derived values run on whole columns, and
+OptionRow gives TransactionCandidate-style access to a
+single option for code that still wants it.
+
+Columns are kept small: prices are int32 cents and the
+derived ratios int32 ten-thousandths (both exact, since the
+DB and TransactionCandidate round to those), greeks are
+float32, dates are int32 day numbers, counts are int32,
+and the string columns are int8/int16/int32 codes into a
+table of byte strings. Integer columns store NULL as
+INT_NULL.
+"""
+import numpy as np
+
+# Storage dtypes.
+FLOAT_DTYPE = np.float32
+DATE_DTYPE = np.int32   # Days since 1970-01-01.
+INT_DTYPE = np.int32    # Counts and fixed-point values.
+INT_NULL = np.iinfo(INT_DTYPE).min # Compares below every real value, like NULL in SQL.
+
+# Units per 1.0 of the fixed-point kinds.
+FIXED_POINT_SCALES = {'money': 100, 'ratio': 10000}
+
+# Column names and kinds, in DB tuple order (see
+# load_trades.get_transaction_candidates_by_date_and_symbol).
+DB_COLUMNS = (('underlying_symbol', 'category'),
+              ('underlying_price',  'money'),
+              ('exchange',          'category'),
+              ('option_root',       'category'),
+              ('option_ext',        'category'),
+              ('option_type',       'category'),
+              ('expiration',        'date'),
+              ('data_date',         'date'),
+              ('strike',            'money'),
+              ('last',              'money'),
+              ('bid',               'money'),
+              ('ask',               'money'),
+              ('volume',            'count'),
+              ('open_interest',     'count'),
+              ('t1_open_interest',  'count'),
+              ('iv',                'float'),
+              ('delta',             'float'),
+              ('gamma',             'float'),
+              ('theta',             'float'),
+              ('vega',              'float'))
+DERIVED_COLUMNS = (('mid',               'money'),
+                   ('rel_value',         'ratio'),
+                   ('rel_strike',        'ratio'),
+                   ('bid_ask_spread',    'ratio'))
+COLUMN_KINDS = dict(DB_COLUMNS + DERIVED_COLUMNS)
+DATE_COLUMNS = tuple(name for name, kind in DB_COLUMNS if kind == 'date')
+COLUMNS = tuple(COLUMN_KINDS)
+
+"""Converts dates (datetime.date, datetime64 or sequences of them) to
+   int32 day numbers."""
+def to_day_numbers(dates):
+    return np.asarray(dates, dtype='datetime64[D]').astype(DATE_DTYPE)
+
+"""Converts int32 day numbers back to datetime64[D]."""
+def from_day_numbers(day_numbers):
+    return np.asarray(day_numbers).astype('datetime64[D]')
+
+"""Converts float values of a fixed-point kind ('money' or 'ratio') to
+   int32 units, NaN and infinities to INT_NULL."""
+def to_fixed_point(values, kind):
+    values = np.asarray(values, dtype=np.float64) * FIXED_POINT_SCALES[kind]
+    fixed_point = np.full(values.shape, INT_NULL, dtype=INT_DTYPE)
+    finite = np.isfinite(values)
+    fixed_point[finite] = np.rint(values[finite])
+    return fixed_point
+
+"""Converts int32 units back to float64, INT_NULL to NaN. Dividing by
+   the scale rounds correctly, so 115 cents comes back as exactly 1.15."""
+def from_fixed_point(fixed_point, kind):
+    fixed_point = np.asarray(fixed_point)
+    values = fixed_point / FIXED_POINT_SCALES[kind]
+    values[fixed_point == INT_NULL] = np.nan
+    return values
+
+"""Smallest signed integer dtype that can index n categories."""
+def _code_dtype(n):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+class OptionChain:
+
+    RISK_FREE_RATE = .011 # Same as TransactionCandidate.
+
+    """Create a chain from a dict of equal-length column arrays, stored
+       as described above. String columns hold codes into
+       categories[name], a sorted array of byte strings."""
+    def __init__(self, columns, categories):
+        self.columns = columns
+        self.categories = categories
+
+    """Build a chain from raw DB tuples, in the same layout
+       TransactionCandidate takes."""
+    @classmethod
+    def from_db_tuples(cls, backtest_data_db_tuples):
+        import load_trades # load_trades imports this module.
+
+        rows = list(backtest_data_db_tuples)
+        columns = dict()
+        categories = dict()
+        for index, (name, kind) in enumerate(DB_COLUMNS):
+            values = [row[index] for row in rows]
+            if kind == 'money':
+                columns[name] = to_fixed_point(load_trades.parse_money(values), kind)
+            elif kind == 'float':
+                columns[name] = np.array([np.nan if value == None else float(value) for value in values],
+                                         dtype=FLOAT_DTYPE)
+            elif kind == 'count':
+                columns[name] = np.array([INT_NULL if value == None else value for value in values],
+                                         dtype=INT_DTYPE)
+            elif kind == 'date':
+                columns[name] = to_day_numbers(values)
+            else:
+                values = np.array(['' if value == None else value for value in values], dtype=np.bytes_)
+                categories[name], codes = np.unique(values, return_inverse=True)
+                columns[name] = codes.astype(_code_dtype(len(categories[name])))
+        for name, kind in DERIVED_COLUMNS:
+            columns[name] = np.full(len(rows), INT_NULL, dtype=INT_DTYPE)
+        return cls(columns, categories)
+
+    """Returns the chain as DB tuples (the inverse of from_db_tuples):
+       money values as floats, NULLs as None."""
+    def to_db_tuples(self):
+        values = []
+        for name, kind in DB_COLUMNS:
+            column = self.columns[name]
+            if kind == 'category':
+                strings = self.categories[name][column].astype(np.str_).tolist()
+                values.append([string if string != '' else None for string in strings])
+            elif kind == 'count':
+                values.append([None if value == INT_NULL else value for value in column.tolist()])
+            elif kind == 'date':
+                values.append(from_day_numbers(column).tolist())
+            else:
+                values.append([None if value != value else value for value in self.get_values(name).tolist()])
+        return list(zip(*values))
+
+    def __len__(self):
+        return len(self.columns['strike'])
+
+    """Column access by attribute, e.g. chain.strike. String columns
+       are decoded from their codes, dates come back as datetime64 and
+       money, ratios and greeks as float64 with NaN for NULL. Counts
+       are the stored int32 column, INT_NULL included."""
+    def __getattr__(self, name):
+        columns = self.__dict__.get('columns')
+        if columns == None or name not in columns:
+            raise AttributeError(name)
+        kind = COLUMN_KINDS[name]
+        if kind == 'category':
+            return self.categories[name][columns[name]].astype(np.str_)
+        if kind == 'date':
+            return from_day_numbers(columns[name])
+        if kind == 'count':
+            return columns[name]
+        return self.get_values(name)
+
+    """Returns a money, ratio or greek column as float64, NaN for NULL."""
+    def get_values(self, name):
+        kind = COLUMN_KINDS[name]
+        if kind == 'float':
+            return self.columns[name].astype(np.float64)
+        return from_fixed_point(self.columns[name], kind)
+
+    """Stores float64 values (NaN for NULL) into a money, ratio or greek
+       column."""
+    def set_values(self, name, values):
+        kind = COLUMN_KINDS[name]
+        if kind == 'float':
+            self.columns[name] = np.asarray(values, dtype=FLOAT_DTYPE)
+        else:
+            self.columns[name] = to_fixed_point(values, kind)
+
+    """An int returns an OptionRow; a slice, mask or index array returns
+       a new OptionChain. The category tables are shared until a row
+       write adds a value (see OptionRow.__setattr__)."""
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            return OptionRow(self, key)
+        return OptionChain({name: column[key] for name, column in self.columns.items()},
+                           dict(self.categories))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield OptionRow(self, index)
+
+    """Returns the chain rows where mask is True."""
+    def filter(self, mask):
+        return self[np.asarray(mask, dtype=bool)]
+
+    """Returns the chain sorted by one or more columns (last key is
+       the primary one, as in np.lexsort). Codes sort like their
+       strings, since the categories are sorted."""
+    def sort(self, *names):
+        order = np.lexsort(tuple(self.columns[name] for name in names))
+        return self[order]
+
+    """Returns the chain split into sub-chains by data_date."""
+    def split_by_date(self):
+        chains_by_date = dict()
+        for day_number in np.unique(self.columns['data_date']):
+            data_date = from_day_numbers(day_number).item()
+            chains_by_date[data_date] = self.filter(self.columns['data_date'] == day_number)
+        return chains_by_date
+
+    """Fill mid, rel_value, rel_strike and bid_ask_spread for every option,
+       rounded as in TransactionCandidate."""
+    def calculate_derived_values(self):
+        bid = self.get_values('bid')
+        ask = self.get_values('ask')
+        underlying_price = self.get_values('underlying_price')
+        mid = self.get_values('mid')
+        missing = np.isnan(mid)
+        mid[missing] = np.round((bid[missing] + ask[missing])/2, 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.set_values('mid', mid)
+            self.set_values('rel_value', np.round(mid/underlying_price, 4))
+            self.set_values('rel_strike', np.round(self.get_values('strike')/underlying_price, 4))
+            self.set_values('bid_ask_spread', np.round((ask - bid)/np.maximum(mid, .001), 4))
+
+    """Returns the days to expiration of every option."""
+    def get_days_to_expiration(self):
+        return (self.columns['expiration'] - self.columns['data_date']).astype(np.int64)
+
+    """Returns the years to expiration of every option, as in TransactionCandidate."""
+    def get_years_to_expiration(self):
+        years = np.round(self.get_days_to_expiration() / 365, 3)
+        return np.maximum(years, .001) # Avoid division by zero.
+
+    """Returns the risk-free rate of every option, from the yield curve."""
+    def get_risk_free_rates(self):
+        import load_trades
+        return load_trades.get_risk_free_rates(self.data_date, self.get_years_to_expiration())
+
+    """Approximate bytes held by the columns and categories."""
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values()) + \
+            sum(category.nbytes for category in self.categories.values())
+
+class OptionRow:
+
+    """A view of one option in an OptionChain. Attribute reads and
+       writes go straight to the chain's columns."""
+    __slots__ = ('_chain', '_index')
+
+    RISK_FREE_RATE = OptionChain.RISK_FREE_RATE
+
+    def __init__(self, chain, index):
+        object.__setattr__(self, '_chain', chain)
+        object.__setattr__(self, '_index', index)
+
+    def __getattr__(self, name):
+        columns = self._chain.columns
+        if name not in columns:
+            raise AttributeError(name)
+        value = columns[name][self._index]
+        kind = COLUMN_KINDS[name]
+        if kind == 'category':
+            value = self._chain.categories[name][value].decode()
+            return value if value != '' else None
+        if kind == 'date':
+            return from_day_numbers(value).item()
+        if kind == 'float':
+            return None if np.isnan(value) else float(value)
+        if value == INT_NULL:
+            return None
+        if kind == 'count':
+            return int(value)
+        return int(value) / FIXED_POINT_SCALES[kind]
+
+    def __setattr__(self, name, value):
+        chain = self._chain
+        columns = chain.columns
+        if name not in columns:
+            raise AttributeError(name)
+        kind = COLUMN_KINDS[name]
+        if kind == 'category':
+            value = ('' if value == None else value).encode()
+            categories = chain.categories[name]
+            if value not in categories:
+                # Keep the table sorted, renumbering the existing codes.
+                # Other chains may share the tables dict, so replace it
+                # rather than change it.
+                new_categories = np.sort(np.append(categories, value))
+                renumbered = np.searchsorted(new_categories, categories)
+                chain.categories = dict(chain.categories)
+                chain.categories[name] = new_categories
+                columns[name] = renumbered[columns[name]].astype(_code_dtype(len(new_categories)))
+            value = np.searchsorted(chain.categories[name], value)
+        elif kind == 'date':
+            value = to_day_numbers(value)
+        elif kind == 'float':
+            value = np.nan if value == None else value
+        elif value == None:
+            value = INT_NULL
+        elif kind != 'count':
+            value = round(value * FIXED_POINT_SCALES[kind])
+        columns[name][self._index] = value
+
+    """Return the mid between the bid/ask in the option_data."""
+    def calculate_mid(self):
+        self.mid = round((self.bid + self.ask)/2, 2)
+
+    """Fill in the relative value and relative strike. Greeks
+       are not calculated on a row view."""
+    def calculate_derived_values(self, calculate_greeks=True):
+        if self.mid == None:
+            self.calculate_mid()
+        self.rel_value = round(self.mid/self.underlying_price, 4)
+        self.rel_strike = round(self.strike/self.underlying_price, 4)
+        self.bid_ask_spread = round((self.ask - self.bid)/max(self.mid, .001), 4)
+
+    """Returns the risk-free rate for this option's date and time to
+       expiration, as TransactionCandidate.get_risk_free_rate does."""
+    def get_risk_free_rate(self):
+        import load_trades
+        years_to_expiration = max(round(float((self.expiration - self.data_date).days) / 365, 3), .001)
+        return float(load_trades.get_risk_free_rates(self.data_date, years_to_expiration))
+
+    """Convenience function to print the info for this transaction."""
+    def print_stats(self):
+        from TransactionCandidate import TransactionCandidate
+        return TransactionCandidate.print_stats(self)
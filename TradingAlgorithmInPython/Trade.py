@@ -14,6 +14,38 @@ from Transaction import Transaction
 
 class Trade:
 
+    __slots__ = ('opening_transactions',
+                 'closing_transactions',
+                 'open_date',
+                 'open_rel_date',
+                 'close_date',
+                 'close_rel_date',
+                 'open_value',
+                 'open_rel_value',
+                 'close_value',
+                 'earnings_date',
+                 'max_possible_loss',
+                 'premium2margin',
+                 'profit_percent',
+                 'profit_dollars',
+                 'position_iv',
+                 'position_delta',
+                 'position_theta',
+                 'position_gamma',
+                 'position_vega',
+                 'original_confidence',
+                 'original_category',
+                 'current_confidence',
+                 'current_category',
+                 'num_compliant_trades',
+                 'weight',
+                 'num_contracts',
+                 'reason',
+                 'daily_returns',
+                 'daily_close_values',
+                 'model_name',
+                 'original_state')
+
     def __init__(self):
         self.opening_transactions = []
         self.closing_transactions = []
@@ -783,8 +815,12 @@ class Trade:
     """Returns the current value of this trade."""
     def get_current_value(self, current_date):
         current_value = 0.0
+        mids = load_trades.get_mids([(opening_transaction.stats.option_root, current_date)
+                                     for opening_transaction in self.opening_transactions],
+                                    {opening_transaction.stats.option_root: opening_transaction.stats.underlying_symbol
+                                     for opening_transaction in self.opening_transactions})
         for opening_transaction in self.opening_transactions:
-            mid = load_trades.get_mid(opening_transaction.stats.option_root, current_date)
+            mid = mids[(opening_transaction.stats.option_root, current_date)]
             if mid == None:
                 return None
             if opening_transaction.buy_or_sell == 'buy':
@@ -7,6 +7,8 @@ import random
 
 class Transaction:
 
+    __slots__ = ('stats', 'buy_or_sell')
+
     def __init__(self):
         # This is a TransactionCandidate.
         self.stats = None
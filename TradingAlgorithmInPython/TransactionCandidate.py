@@ -17,39 +17,117 @@ from py_lets_be_rational.exceptions import BelowIntrinsicException, AboveMaximum
 
 class TransactionCandidate:
 
-    """Create a new TradeCandidate object and populate Greeks and IV."""
-    def __init__(self, backtest_data_db_tuple):
+    # Slots instead of a per-instance __dict__; we hold a great many of these.
+    __slots__ = ('underlying_symbol',
+                 'underlying_price',
+                 'exchange',
+                 'option_root',
+                 'option_ext',
+                 'option_type',
+                 'expiration',
+                 'data_date',
+                 'strike',
+                 'last',
+                 'bid',
+                 'ask',
+                 'volume',
+                 'open_interest',
+                 't1_open_interest',
+                 '_mid',
+                 '_rel_value',
+                 '_rel_strike',
+                 '_bid_ask_spread',
+                 'iv',
+                 'delta',
+                 'gamma',
+                 'theta',
+                 'vega')
+
+    RISK_FREE_RATE = .011
+
+    """Create a new TradeCandidate object and populate Greeks and IV.
+       money_values, if given, are the already parsed floats for
+       underlying_price, strike, last, bid and ask (see
+       load_trades.parse_money_columns)."""
+    def __init__(self, backtest_data_db_tuple, money_values=None):
+
+        if money_values == None:
+            money_values = [load_trades.parse_money_value(backtest_data_db_tuple[index])
+                            for index in load_trades.MONEY_COLUMN_INDEXES]
+        underlying_price, strike, last, bid, ask = money_values
 
-        self.RISK_FREE_RATE       = .011
         self.underlying_symbol    = backtest_data_db_tuple[0]
-        self.underlying_price     = float(backtest_data_db_tuple[1].replace('$', '').replace(',', ''))
+        self.underlying_price     = underlying_price
         self.exchange             = backtest_data_db_tuple[2]
         self.option_root          = backtest_data_db_tuple[3]
         self.option_ext           = backtest_data_db_tuple[4]
         self.option_type          = backtest_data_db_tuple[5]
         self.expiration           = backtest_data_db_tuple[6]
         self.data_date            = backtest_data_db_tuple[7]
-        self.strike               = float(
-            backtest_data_db_tuple[8].replace('$', '').replace(',', ''))
-        self.last                 = float(
-            backtest_data_db_tuple[9].replace('$', '').replace(',', ''))
-        self.bid                  = float(
-            backtest_data_db_tuple[10].replace('$', '').replace(',', ''))
-        self.ask                  = float(
-            backtest_data_db_tuple[11].replace('$', '').replace(',', ''))
+        self.strike               = strike
+        self.last                 = last
+        self.bid                  = bid
+        self.ask                  = ask
         self.volume               = backtest_data_db_tuple[12]
         self.open_interest        = backtest_data_db_tuple[13]
         self.t1_open_interest     = backtest_data_db_tuple[14]
-        self.mid                  = None
-        self.rel_value            = None
-        self.rel_strike           = None
-        self.bid_ask_spread       = None
+        self._mid                 = None
+        self._rel_value           = None
+        self._rel_strike          = None
+        self._bid_ask_spread      = None
         self.iv                   = backtest_data_db_tuple[15]
         self.delta                = backtest_data_db_tuple[16]
         self.gamma                = backtest_data_db_tuple[17]
         self.theta                = backtest_data_db_tuple[18]
         self.vega                 = backtest_data_db_tuple[19]
 
+    """The mid, computed from the bid/ask on first access.
+       Setting it resets the values derived from it."""
+    @property
+    def mid(self):
+        if self._mid == None:
+            self._mid = round((self.bid + self.ask)/2, 2)
+        return self._mid
+
+    @mid.setter
+    def mid(self, mid):
+        self._mid = mid
+        self._rel_value = None
+        self._bid_ask_spread = None
+
+    """Relative value, computed on first access."""
+    @property
+    def rel_value(self):
+        if self._rel_value == None:
+            self._rel_value = round(self.mid/self.underlying_price, 4)
+        return self._rel_value
+
+    @rel_value.setter
+    def rel_value(self, rel_value):
+        self._rel_value = rel_value
+
+    """Relative strike, computed on first access."""
+    @property
+    def rel_strike(self):
+        if self._rel_strike == None:
+            self._rel_strike = round(self.strike/self.underlying_price, 4)
+        return self._rel_strike
+
+    @rel_strike.setter
+    def rel_strike(self, rel_strike):
+        self._rel_strike = rel_strike
+
+    """Bid-ask spread relative to the mid, computed on first access."""
+    @property
+    def bid_ask_spread(self):
+        if self._bid_ask_spread == None:
+            self._bid_ask_spread = round((self.ask - self.bid)/max(self.mid, .001), 4)
+        return self._bid_ask_spread
+
+    @bid_ask_spread.setter
+    def bid_ask_spread(self, bid_ask_spread):
+        self._bid_ask_spread = bid_ask_spread
+
     """Return the mid between the bid/ask in the option_data."""
     def calculate_mid(self):
         self.mid = round((self.bid + self.ask)/2, 2)
@@ -65,6 +143,12 @@ class TransactionCandidate:
     def get_days_to_expiration(self, data_date, expiration):
         return (expiration - data_date).days
 
+    """Returns the risk-free rate for this option's date and time to
+       expiration, from the yield curve (RISK_FREE_RATE without one)."""
+    def get_risk_free_rate(self):
+        years_to_expiration = self.get_years_to_expiration(self.data_date, self.expiration)
+        return float(load_trades.get_risk_free_rates(self.data_date, years_to_expiration))
+
     """Wrapper for vollib's IV calculation.
        Returns IV to 4 decimal places.
        The option_type flag must be either 'p'
@@ -181,15 +265,12 @@ class TransactionCandidate:
                         dividend_rate)
         return round(raw_vega, 4)
 
-    """Fill in the relative value and relative strike."""
+    """Fill in the greeks. The relative value, relative strike
+       and bid-ask spread are properties."""
     def calculate_derived_values(self, calculate_greeks=True):
 
-        # Pricing stuff.
-        if self.mid == None:
-            self.calculate_mid()
-        self.rel_value = round(self.mid/self.underlying_price, 4)
-        self.rel_strike = round(self.strike/self.underlying_price, 4)
-        self.bid_ask_spread = round((self.ask - self.bid)/max(self.mid, .001), 4)
+        # Pricing stuff. mid, rel_value, rel_strike and bid_ask_spread
+        # are filled in lazily on first access.
 
         # If we don't need the Greeks, return.
         if not calculate_greeks:
@@ -203,6 +284,7 @@ class TransactionCandidate:
            self.theta == None or \
            self.vega == None:
             need_to_store_greeks = True
+            risk_free_rate = self.get_risk_free_rate()
             
         # Calculate greeks, if necessary.
         option_type_flag = ""
@@ -218,7 +300,7 @@ class TransactionCandidate:
                                                   self.strike,
                                                   self.data_date,
                                                   self.expiration,
-                                                  self.RISK_FREE_RATE,
+                                                  risk_free_rate,
                                                   option_type_flag)
         if self.delta == None:
             self.delta              = self.get_delta(option_type_flag,
@@ -226,7 +308,7 @@ class TransactionCandidate:
                                                      self.strike,
                                                      self.data_date,
                                                      self.expiration,
-                                                     self.RISK_FREE_RATE,
+                                                     risk_free_rate,
                                                      self.iv)
         if self.theta == None:
             self.theta              = self.get_theta(option_type_flag,
@@ -234,7 +316,7 @@ class TransactionCandidate:
                                                      self.strike,
                                                      self.data_date,
                                                      self.expiration,
-                                                     self.RISK_FREE_RATE,
+                                                     risk_free_rate,
                                                      self.iv)
         if self.gamma == None:
             self.gamma              = self.get_gamma(option_type_flag,
@@ -242,7 +324,7 @@ class TransactionCandidate:
                                                      self.strike,
                                                      self.data_date,
                                                      self.expiration,
-                                                     self.RISK_FREE_RATE,
+                                                     risk_free_rate,
                                                      self.iv)
         if self.vega == None:
             self.vega               = self.get_vega(option_type_flag,
@@ -250,7 +332,7 @@ class TransactionCandidate:
                                                     self.strike,
                                                     self.data_date,
                                                     self.expiration,
-                                                    self.RISK_FREE_RATE,
+                                                    risk_free_rate,
                                                     self.iv)
         # Store for later use.
         if need_to_store_greeks:
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Fills cached_greeks for every option_prices row that lacks them,
+over a list of symbols and a date range, so backtests start with
+a warm cache. Each (symbol, date) is one unit of work, computed in
+a worker process and committed on its own. The work list is built
+from what is still missing, so an interrupted run just picks up
+where it stopped when started again.
+
+Usage: backfill_greeks.py [-w WORKERS] START_DATE END_DATE SYMBOL [SYMBOL ...]
+"""
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+import load_trades
+import argparse
+import multiprocessing
+import time
+from dateutil import parser
+
+# Constants.
+DEFAULT_WORKERS = multiprocessing.cpu_count()
+
+"""Backfill one symbol on one date, in a worker process."""
+def backfill_date(symbol_and_date):
+    symbol, data_date = symbol_and_date
+    return symbol, data_date, load_trades.backfill_greeks(symbol, data_date)
+
+"""Returns every (symbol, date) with greeks still missing."""
+def find_work(symbols, start_date, end_date):
+    work = []
+    for symbol in symbols:
+        dates = load_trades.get_dates_missing_greeks(symbol, start_date, end_date)
+        print(symbol + ": " + str(len(dates)) + " dates to backfill")
+        work.extend((symbol, data_date) for data_date in dates)
+    return work
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='Backfill cached_greeks.')
+    argument_parser.add_argument('start_date')
+    argument_parser.add_argument('end_date')
+    argument_parser.add_argument('symbols', nargs='+')
+    argument_parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS)
+    args = argument_parser.parse_args()
+
+    start_date = parser.parse(args.start_date).date()
+    end_date = parser.parse(args.end_date).date()
+    symbols = [symbol.upper() for symbol in args.symbols]
+
+    work = find_work(symbols, start_date, end_date)
+    if len(work) == 0:
+        print("Nothing to backfill.")
+        return
+
+    start_time = time.time()
+    num_options = 0
+    with multiprocessing.Pool(args.workers) as pool:
+        for done, (symbol, data_date, count) in enumerate(pool.imap_unordered(backfill_date, work), 1):
+            num_options += count
+            elapsed = time.time() - start_time
+            remaining = elapsed / done * (len(work) - done)
+            print("[" + str(done) + "/" + str(len(work)) + "] " +
+                  symbol + " " + str(data_date) + ": " + str(count) + " options, " +
+                  str(num_options) + " total, " +
+                  str(round(num_options / elapsed)) + " options/s, " +
+                  str(round(remaining)) + "s left")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+A pool of connections to the backtest database shared by all
+of load_trades, instead of a new connection per query. Callers
+block while every connection is checked out. A process forked
+from one that already used the pool (e.g. a multiprocessing
+worker) starts a pool of its own rather than sharing sockets
+with its parent.
+"""
+import os
+import atexit
+import threading
+import time
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+# Constants.
+DATABASE = 'backtest_data'
+DEFAULT_POOL_SIZE = int(os.environ.get('BACKTEST_DB_POOL_SIZE', 8))
+
+_pool = None
+_pool_size = DEFAULT_POOL_SIZE
+_pool_pid = None
+_slots = None
+_lock = threading.Lock()
+_stats = dict()
+
+"""Sets the maximum number of pooled connections. Takes effect
+   the next time the pool is created (i.e. call before first use,
+   or after close_all())."""
+def configure(pool_size):
+    global _pool_size
+    with _lock:
+        _pool_size = pool_size
+
+"""Returns the pool for this process, creating it if needed."""
+def _get_pool():
+    global _pool, _pool_pid, _slots
+    pid = os.getpid()
+    with _lock:
+        if _pool == None or _pool_pid != pid:
+            # Connections inherited over fork belong to the parent; drop
+            # them without closing, which would end the parent's sessions.
+            _pool = ThreadedConnectionPool(0, _pool_size, database=DATABASE)
+            _pool_pid = pid
+            _slots = threading.BoundedSemaphore(_pool_size)
+            _reset_stats()
+        return _pool, _slots
+
+def _reset_stats():
+    _stats.clear()
+    _stats.update({'checkouts': 0, 'waits': 0, 'wait_seconds': 0.0,
+                   'max_wait_seconds': 0.0, 'in_use': 0, 'max_in_use': 0})
+
+"""Checks out a connection, waiting for one to be returned if the
+   pool is at its maximum size."""
+def getconn():
+    pool, slots = _get_pool()
+    start_time = time.time()
+    waited = not slots.acquire(blocking=False)
+    if waited:
+        slots.acquire()
+    wait_seconds = time.time() - start_time
+    try:
+        connection = pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+    with _lock:
+        _stats['checkouts'] += 1
+        _stats['waits'] += int(waited)
+        _stats['wait_seconds'] += wait_seconds
+        _stats['max_wait_seconds'] = max(_stats['max_wait_seconds'], wait_seconds)
+        _stats['in_use'] += 1
+        _stats['max_in_use'] = max(_stats['max_in_use'], _stats['in_use'])
+    return connection
+
+"""Returns a connection to the pool. Any open transaction is rolled
+   back; a broken connection is closed and replaced on demand."""
+def putconn(connection):
+    pool, slots = _get_pool()
+    try:
+        pool.putconn(connection, close=bool(connection.closed))
+    except psycopg2.pool.PoolError:
+        # Checked out before a fork; not ours to return.
+        return
+    with _lock:
+        _stats['in_use'] -= 1
+    slots.release()
+
+"""Closes every pooled connection of this process."""
+def close_all():
+    global _pool
+    with _lock:
+        if _pool != None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+"""Returns checkout and wait metrics for this process's pool."""
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['pool_size'] = _pool_size
+    checkouts = stats.get('checkouts', 0)
+    stats['mean_wait_seconds'] = stats['wait_seconds'] / checkouts if checkouts else 0.0
+    return stats
+
+# A lock held by another thread at fork time would never be released
+# in the child.
+def _reset_lock_after_fork():
+    global _lock
+    _lock = threading.Lock()
+
+_reset_stats()
+atexit.register(close_all)
+os.register_at_fork(after_in_child=_reset_lock_after_fork)
@@ -169,6 +169,14 @@ for current_date in (start_date + datetime.timedelta(days=n) for n in range(num_
 
     print(str(current_date))
 
+    # Look up today's mids for every open position in one go.
+    load_trades.get_mids([(opening_transaction.stats.option_root, current_date)
+                          for open_symbol, trade in open_trades
+                          for opening_transaction in trade.opening_transactions],
+                         {opening_transaction.stats.option_root: open_symbol
+                          for open_symbol, trade in open_trades
+                          for opening_transaction in trade.opening_transactions})
+
     # Check each symbol.
     found_symbol_in_open_trades = False
     for symbol in whitelist_symbols:
@@ -1,7 +1,78 @@
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+import os
 import psycopg2
 import datetime
+import atexit
+import threading
+import numpy as np
+import connection_pool
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from psycopg2.extras import execute_values
 from importlib import import_module
 from TransactionCandidate import TransactionCandidate
+from OptionChain import OptionChain
+from EarningsCalendar import EarningsCalendar
+from BlackScholes.main import implied_volatility_vec, greeks, IV_CONVERGED, IV_BELOW_INTRINSIC
+from FixedIncomeModeling.yield_curve import YieldCurve
+
+# Positions of the cached_greeks columns in an option_prices/cached_greeks row.
+GREEK_COLUMN_INDEXES = (15, 16, 17, 18, 19)
+GREEK_NAMES = ('iv', 'delta', 'gamma', 'theta', 'vega')
+
+# Positions of the money columns in an option_prices/cached_greeks row:
+# underlying_price, strike, last, bid, ask.
+MONEY_COLUMN_INDEXES = (1, 8, 9, 10, 11)
+MONEY_COLUMN_NAMES = ('underlying_price', 'strike', 'last', 'bid', 'ask')
+
+# The earnings_dates table, loaded once and kept in memory.
+earnings_calendar = EarningsCalendar()
+
+# When set, option data comes from local snapshots instead of the DB
+# (see snapshot.py and use_snapshots).
+_snapshot_store = None
+
+"""Serve get_transaction_candidates_by_date_and_symbol (and everything
+   built on it), get_mid and get_underlying_prices from the snapshots
+   under directory (snapshot.SNAPSHOT_DIR by default) instead of the DB."""
+def use_snapshots(directory=None):
+    global _snapshot_store
+    from snapshot import SnapshotStore, SNAPSHOT_DIR
+    _snapshot_store = SnapshotStore(directory if directory != None else SNAPSHOT_DIR)
+
+"""Go back to reading option data from the DB."""
+def use_database():
+    global _snapshot_store
+    _snapshot_store = None
+
+"""Converts a sequence of money values from the DB ('$1,234.50') to a
+   float64 array in one step. None becomes NaN. All the strings are
+   joined and stripped of '$' and ',' once, instead of once per value.
+   If that does not give one number per value (an empty string, or one
+   with whitespace in it), each value is parsed on its own instead."""
+def parse_money(values):
+    values = ['nan' if value == None else value for value in values]
+    if all(isinstance(value, str) for value in values):
+        parsed = ' '.join(values).replace('$', '').replace(',', '').split()
+        if len(parsed) == len(values):
+            return np.array(parsed, dtype=np.float64)
+    return np.array([parse_money_value(value) for value in values], dtype=np.float64)
+
+"""Converts a single money value from the DB to a float."""
+def parse_money_value(value):
+    if value == None:
+        return np.nan
+    if isinstance(value, str):
+        value = value.replace('$', '').replace(',', '').strip()
+        return float(value) if value != '' else np.nan
+    return float(value)
+
+"""Returns the money columns of a fetched result set as float64 arrays,
+   in MONEY_COLUMN_INDEXES order."""
+def parse_money_columns(transaction_candidates_tuple):
+    return [parse_money([row[index] for row in transaction_candidates_tuple])
+            for index in MONEY_COLUMN_INDEXES]
 
 """Load all trades that meet our parameters
    around each earnings date that we have in 
@@ -24,7 +95,8 @@ def load(underlying_symbol,
     # Keys: earnings_date, Value: transaction_candidates_tuple
     candidates_by_earnings_and_date = dict()
 
-    # Collect candidate transactions.
+    # Find the data window around each earnings date.
+    windows = []
     for earnings_date in earnings_dates:
 
         # Don't search earnings dates that are too early or too late.
@@ -35,76 +107,137 @@ def load(underlying_symbol,
             if earnings_date > latest_data_date:
                 continue
 
+        window = _get_candidate_window(earnings_date,
+                                       earliest_data_date,
+                                       latest_data_date,
+                                       earliest_rel_open_date,
+                                       latest_rel_close_date)
+        if window != None:
+            windows.append((earnings_date,) + window)
+
+    # Fetch every window in one query.
+    data_dates = set()
+    for earnings_date, earliest_date, latest_date in windows:
+        data_dates.update(_get_calendar_dates(earliest_date, latest_date))
+    tuples_by_date = dict()
+    if len(data_dates) > 0:
+        tuples_by_date = _split_by_date(_fetch_transaction_candidate_tuples(
+            underlying_symbol, None, None, min_open_interest, sorted(data_dates)))
+
+    # Collect candidate transactions.
+    for earnings_date, earliest_date, latest_date in windows:
+
         # Get the eligible transactions for this symbol and earnings date.
-        candidates_by_date = get_transaction_candidates(earnings_date,
-                                                        underlying_symbol,
-                                                        earliest_data_date,
-                                                        latest_data_date,
-                                                        earliest_rel_open_date,
-                                                        latest_rel_close_date,
-                                                        min_open_interest,
-                                                        max_bid_ask_spread)
+        candidates_by_date = _get_candidates_by_date(tuples_by_date,
+                                                     earnings_date,
+                                                     earliest_date,
+                                                     latest_date,
+                                                     max_bid_ask_spread)
 
         # Store.
         if len(candidates_by_date) > 0:
             candidates_by_earnings_and_date[str(earnings_date)] = candidates_by_date
 
+    # Write out any greeks calculated along the way.
+    if not _is_greeks_flush_deferred():
+        flush_greeks()
+
     return candidates_by_earnings_and_date
 
-"""Returns a list of earnings dates for this symbol."""
-def get_earnings_dates(underlying_symbol):
-    connection = None
-    try:
-        connection = psycopg2.connect(database='backtest_data')
-        cursor = connection.cursor()
-        cursor.execute("SELECT earnings_date FROM earnings_dates WHERE underlying_symbol=%s;", (underlying_symbol,))
-        earnings_dates_tuples = cursor.fetchall()
-        
-    except psycopg2.DatabaseError as e:
-        if connection:
-            connection.rollback()
-        print(e.message)
-        exit(1)
+"""Runs load() for many symbols concurrently, at most max_workers at a
+   time (by default the connection pool size; more would only leave
+   threads waiting for connections), printing progress as each one
+   finishes. Returns a dict of symbol -> candidates_by_earnings_and_date
+   (as returned by load()). A symbol that raises is left out instead of
+   ending the run; if errors is a dict, it gets symbol -> exception for
+   each of them.
+
+   The calling thread is the only one writing cached_greeks: it flushes
+   whenever GREEKS_FLUSH_SIZE greeks are queued and once at the end. A
+   failed write is the run's, not any one symbol's; it is printed and
+   recorded in errors under None, and the run carries on."""
+def load_many(underlying_symbols,
+              earliest_data_date,
+              latest_data_date,
+              earliest_rel_open_date,
+              latest_rel_close_date,
+              min_open_interest,
+              max_bid_ask_spread=None,
+              max_workers=None,
+              errors=None):
+
+    if max_workers == None:
+        max_workers = connection_pool.get_stats()['pool_size']
+    underlying_symbols = list(dict.fromkeys(symbol.upper() for symbol in underlying_symbols))
+    candidates_by_symbol = dict()
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_load_deferring_greeks_flush,
+                                   underlying_symbol,
+                                   earliest_data_date,
+                                   latest_data_date,
+                                   earliest_rel_open_date,
+                                   latest_rel_close_date,
+                                   min_open_interest,
+                                   max_bid_ask_spread): underlying_symbol
+                   for underlying_symbol in underlying_symbols}
+
+        pending = set(futures)
+        while len(pending) > 0:
+            finished, pending = wait(pending, timeout=GREEKS_FLUSH_POLL_SECONDS,
+                                     return_when=FIRST_COMPLETED)
+            if len(_greeks_buffer) >= GREEKS_FLUSH_SIZE:
+                _flush_greeks_for_run(errors)
+
+            for future in finished:
+                underlying_symbol = futures[future]
+                done += 1
+                progress = "[" + str(done) + "/" + str(len(futures)) + "] " + underlying_symbol + ": "
+
+                try:
+                    candidates_by_symbol[underlying_symbol] = future.result()
+                except Exception as e:
+                    print(progress + "failed (" + repr(e) + ")")
+                    if errors != None:
+                        errors[underlying_symbol] = e
+                    continue
+                print(progress + str(len(candidates_by_symbol[underlying_symbol])) + " earnings dates")
 
-    finally:
-        if connection:
-            connection.close()
+    _flush_greeks_for_run(errors)
 
-    # Convert the tuples to a plain list.
-    earnings_dates = []
-    for instance in earnings_dates_tuples:
-        earnings_dates.append(instance[0])
-    return earnings_dates
+    # Same order as requested.
+    return {symbol: candidates_by_symbol[symbol] for symbol in underlying_symbols
+            if symbol in candidates_by_symbol}
 
-"""Returns a earnings data for this symbol."""
-def get_earnings_data(underlying_symbol):
-    connection = None
+# How often load_many checks whether its workers have filled the greeks buffer.
+GREEKS_FLUSH_POLL_SECONDS = .1
+
+"""load() for a load_many worker thread, which leaves writing the
+   greeks it calculates to load_many."""
+def _load_deferring_greeks_flush(*args):
+    _greeks_flush_deferred.active = True
     try:
-        connection = psycopg2.connect(database='backtest_data')
-        cursor = connection.cursor()
-        cursor.execute("SELECT earnings_date, earnings_estimate, reported_earnings, before_or_after FROM earnings_dates WHERE underlying_symbol=%s;", (underlying_symbol,))
-        earnings_data_tuples = cursor.fetchall()
-        
+        return load(*args)
+    finally:
+        _greeks_flush_deferred.active = False
+
+"""flush_greeks for load_many. The buffer holds every symbol's greeks,
+   so a failed write is recorded against the run (errors[None])."""
+def _flush_greeks_for_run(errors):
+    try:
+        flush_greeks()
     except psycopg2.DatabaseError as e:
-        if connection:
-            connection.rollback()
-        print(e.message)
-        exit(1)
+        print("Writing cached_greeks failed (" + repr(e) + ")")
+        if errors != None:
+            errors[None] = e
 
-    finally:
-        if connection:
-            connection.close()
-
-    # Convert the tuples to a plain list.
-    earnings_data = []
-    for instance in earnings_data_tuples:
-        row = dict()
-        row['earnings_date'] = instance[0]
-        row['earnings_estimate'] = instance[1]
-        row['reported_earnings'] = instance[2]
-        row['before_or_after'] = instance[3]
-        earnings_data.append(row)
-    return earnings_data
+"""Returns a list of earnings dates for this symbol, in order."""
+def get_earnings_dates(underlying_symbol):
+    return earnings_calendar.get_earnings_dates(underlying_symbol)
+
+"""Returns a earnings data for this symbol."""
+def get_earnings_data(underlying_symbol):
+    return earnings_calendar.get_earnings_data(underlying_symbol)
 
 """Pull the eligible transactions from the DB."""
 def get_transaction_candidates(earnings_date,
@@ -116,6 +249,32 @@ def get_transaction_candidates(earnings_date,
                                min_open_interest,
                                max_bid_ask_spread=None):
 
+    window = _get_candidate_window(earnings_date,
+                                   earliest_data_date,
+                                   latest_data_date,
+                                   earliest_rel_open_date,
+                                   latest_rel_close_date)
+    if window == None:
+        return dict()
+    earliest_date, latest_date = window
+
+    # Pull the whole window in one query and split it by date.
+    tuples_by_date = _split_by_date(_fetch_transaction_candidate_tuples(
+        underlying_symbol, earliest_date, latest_date, min_open_interest))
+    return _get_candidates_by_date(tuples_by_date,
+                                   earnings_date,
+                                   earliest_date,
+                                   latest_date,
+                                   max_bid_ask_spread)
+
+"""Returns the (earliest, latest) data dates to trade around this
+   earnings date, or None if the data date limits leave nothing."""
+def _get_candidate_window(earnings_date,
+                          earliest_data_date,
+                          latest_data_date,
+                          earliest_rel_open_date,
+                          latest_rel_close_date):
+
     # Set date limits for trading candidates.
     earliest_date = earnings_date + datetime.timedelta(days=earliest_rel_open_date)
     latest_date = earnings_date + datetime.timedelta(days=latest_rel_close_date)
@@ -130,46 +289,81 @@ def get_transaction_candidates(earnings_date,
     if latest_date.weekday() == 5:
         latest_date += datetime.timedelta(days=2)
 
-    # Pull transaction candidates for each date in our range.
+    # Handle earliest/latest data dates.
+    if earliest_data_date:
+        earliest_date = max(earliest_date, earliest_data_date)
+    if latest_data_date:
+        latest_date = min(latest_date, latest_data_date)
+    if earliest_date > latest_date:
+        return None
+    return earliest_date, latest_date
+
+"""Returns every calendar date from earliest_date to latest_date."""
+def _get_calendar_dates(earliest_date, latest_date):
+    return [earliest_date + datetime.timedelta(days=days)
+            for days in range((latest_date - earliest_date).days + 1)]
+
+"""Groups raw DB rows by data_date."""
+def _split_by_date(transaction_candidates_tuple):
+    tuples_by_date = dict()
+    for row in transaction_candidates_tuple:
+        tuples_by_date.setdefault(row[7], []).append(row)
+    return tuples_by_date
+
+"""Converts the rows of each date in [earliest_date, latest_date]
+   and returns them keyed by date, in date order. Dates without
+   candidates are left out."""
+def _get_candidates_by_date(tuples_by_date, earnings_date, earliest_date, latest_date, max_bid_ask_spread):
     candidates_by_date = dict()
-    data_date = earliest_date
-    while data_date <= latest_date:
-
-        # Handle earliest/latest data dates.
-        if earliest_data_date:
-            if data_date < earliest_data_date:
-                data_date += datetime.timedelta(days=1)
-                continue
-        if latest_data_date:
-            if data_date > latest_data_date:
-                break
-
-        transaction_candidates = get_transaction_candidates_by_date_and_symbol(
-            underlying_symbol, data_date, data_date, min_open_interest, earnings_date, max_bid_ask_spread)
+    for data_date in _get_calendar_dates(earliest_date, latest_date):
+        if data_date not in tuples_by_date:
+            continue
+        transaction_candidates = _convert_to_transaction_candidates(
+            tuples_by_date[data_date], earnings_date, max_bid_ask_spread)
 
         # If we found some, store.
         if len(transaction_candidates) > 0:
             candidates_by_date[data_date] = transaction_candidates
-        data_date += datetime.timedelta(days=1)
-
     return candidates_by_date
 
 """Converts a raw database result to a TransactionCandidate."""
 def _convert_to_transaction_candidates(transaction_candidates_tuple, earnings_date, max_bid_ask_spread=None, calculate_greeks=True):
 
+    # Parse the money columns of the whole result set at once.
+    money_columns = parse_money_columns(transaction_candidates_tuple)
+
+    # Error check.
+    usable = np.flatnonzero(money_columns[0] != 0).tolist()
+    money_rows = np.column_stack(money_columns)[usable].tolist() if len(usable) > 0 else []
+
+    # Calculate the greeks missing from cached_greeks in one batch.
+    missing_greeks = dict()
+    if calculate_greeks:
+        missing_greeks = _calculate_missing_greeks(transaction_candidates_tuple, usable, money_rows)
+
     transaction_candidates = []
     # Convert to CandidateTransaction object and add derived data.
-    for transaction_candidate_tuple in transaction_candidates_tuple:
+    for index, money_values in zip(usable, money_rows):
 
         # Create the object.
-        transaction_candidate = TransactionCandidate(transaction_candidate_tuple)
-
-        # Error check.
-        if transaction_candidate.underlying_price == 0:
-            continue
-
-        # Calculate derived data.
-        transaction_candidate.calculate_mid()
+        transaction_candidate = TransactionCandidate(transaction_candidates_tuple[index], money_values)
+
+        # Fill in and cache any greeks we just calculated.
+        if index in missing_greeks:
+            for name, value in zip(GREEK_NAMES, missing_greeks[index]):
+                if getattr(transaction_candidate, name) == None:
+                    setattr(transaction_candidate, name, value)
+            store_greeks(transaction_candidate.data_date,
+                         transaction_candidate.option_root,
+                         transaction_candidate.underlying_symbol,
+                         transaction_candidate.iv,
+                         transaction_candidate.delta,
+                         transaction_candidate.gamma,
+                         transaction_candidate.theta,
+                         transaction_candidate.vega)
+
+        # Calculate derived data. mid and the values built on it are
+        # filled in on first access.
         transaction_candidate.calculate_derived_values(calculate_greeks)
 
         # Filter for bid-ask spread.
@@ -181,39 +375,320 @@ def _convert_to_transaction_candidates(transaction_candidates_tuple, earnings_da
         transaction_candidates.append(transaction_candidate)
     return transaction_candidates
 
-"""
-Returns symbols for all companies releasing earnings on the indicated date.
-Indicates whether the announcement is before or after market close (or neither).
-"""
-def get_upcoming_earnings(earnings_date):
+"""Calculates and stores the missing cached_greeks for every option of
+   this symbol on this date. Returns the number of options written."""
+def backfill_greeks(underlying_symbol, data_date):
+
+    transaction_candidates_tuple = _fetch_transaction_candidate_tuples(
+        underlying_symbol, data_date, data_date, 0)
+    money_columns = parse_money_columns(transaction_candidates_tuple)
+    usable = np.flatnonzero(money_columns[0] != 0).tolist()
+    money_rows = np.column_stack(money_columns)[usable].tolist() if len(usable) > 0 else []
+
+    missing_greeks = _calculate_missing_greeks(transaction_candidates_tuple, usable, money_rows)
+    for index, calculated in missing_greeks.items():
+        row = transaction_candidates_tuple[index]
+
+        # Keep whatever was already cached.
+        values = []
+        for column, value in zip(GREEK_COLUMN_INDEXES, calculated):
+            values.append(value if row[column] == None else row[column])
+        store_greeks(row[7], row[3], row[0], *values)
+
+    flush_greeks()
+    return len(missing_greeks)
+
+"""Returns the data dates in [earliest_date, latest_date] on which this
+   symbol has options without cached greeks, in order. Only rows that
+   backfill_greeks can fill count, so a finished date never comes back."""
+def get_dates_missing_greeks(underlying_symbol, earliest_date, latest_date):
 
     connection = None
     try:
-        connection = psycopg2.connect(database='backtest_data')
+        connection = connection_pool.getconn()
         cursor = connection.cursor()
-        cursor.execute("""SELECT underlying_symbol, before_or_after FROM earnings_dates WHERE
-                          earnings_date=%s;""", (earnings_date,))
-        symbols_tuple = cursor.fetchall()
-        symbols = []
-        for symbol_tuple in symbols_tuple:
-            symbols.append((symbol_tuple[0], symbol_tuple[1]))
+        cursor.execute("""SELECT DISTINCT o.data_date, o.underlying_price
+                          FROM option_prices o
+                          LEFT OUTER JOIN cached_greeks g ON
+                          (o.data_date = g.data_date AND
+                          o.option_root = g.option_root AND
+                          o.underlying_symbol = g.underlying_symbol)
+                          WHERE
+                          o.underlying_symbol=%s AND
+                          o.data_date>=%s AND
+                          o.data_date<=%s AND
+                          o.open_interest>=0 AND
+                          (g.iv IS NULL OR
+                           g.delta IS NULL OR
+                           g.gamma IS NULL OR
+                           g.theta IS NULL OR
+                           g.vega IS NULL)
+                          ORDER BY o.data_date;""",
+                       (underlying_symbol, earliest_date, latest_date))
+        date_tuples = cursor.fetchall()
+
     except psycopg2.DatabaseError as e:
         if connection:
             connection.rollback()
-        print(e.message)
-        exit(1)
+        raise
     finally:
         if connection:
-            connection.close()
-    return symbols
+            connection_pool.putconn(connection)
+
+    # Rows with a zero underlying price can't be filled; check it after
+    # parsing, as backfill_greeks does.
+    prices = parse_money([date_tuple[1] for date_tuple in date_tuples])
+    return sorted(set(date_tuple[0] for date_tuple, price in zip(date_tuples, prices.tolist())
+                      if price != 0))
+
+# Treasury daily par yield curve CSV the risk-free rates come from. Without
+# it every option uses TransactionCandidate.RISK_FREE_RATE.
+YIELD_CURVE_FILE = path.join(path.dirname(path.dirname(path.abspath(__file__))),
+                             'FixedIncomeModeling', 'treasury_yields.csv')
+_yield_curve = None
+_yield_curve_loaded = False
+_yield_curve_lock = threading.Lock()
+
+"""Returns the YieldCurve, loading it on first use, or None if there
+   is no yield curve file."""
+def get_yield_curve():
+    global _yield_curve, _yield_curve_loaded
+    with _yield_curve_lock:
+        if not _yield_curve_loaded:
+            if path.exists(YIELD_CURVE_FILE):
+                _yield_curve = YieldCurve.from_treasury_csv(YIELD_CURVE_FILE)
+            else:
+                print("No yield curve at " + YIELD_CURVE_FILE + ", using a flat " +
+                      str(TransactionCandidate.RISK_FREE_RATE) + " risk-free rate.")
+            _yield_curve_loaded = True
+    return _yield_curve
+
+"""Returns the risk-free rate for each (data_date, years_to_expiration)."""
+def get_risk_free_rates(data_dates, years_to_expiration):
+    yield_curve = get_yield_curve()
+    if yield_curve == None:
+        return np.full(np.broadcast(data_dates, years_to_expiration).shape,
+                       TransactionCandidate.RISK_FREE_RATE)
+    return yield_curve.get_rates(data_dates, years_to_expiration)
+
+# The last known IV per (underlying_symbol, option_root), as (data_date, iv).
+# An IV at most WARM_START_MAX_DAYS old warm-starts the solve for the same
+# option on a later date; IV moves little from one day to the next.
+WARM_START_MAX_DAYS = 5
+MAX_WARM_START_ROOTS = 500000
+_previous_ivs = OrderedDict()
+_iv_solver_stats = {'solved': 0, 'converged': 0, 'iterations': 0,
+                    'warm_started': 0, 'warm_started_iterations': 0}
+_iv_state_lock = threading.Lock()
+
+"""Returns the running IV solver statistics: options solved iteratively,
+   how many converged, how many were warm-started and the mean iterations
+   with and without a warm start."""
+def get_iv_solver_stats():
+    with _iv_state_lock:
+        stats = dict(_iv_solver_stats)
+    cold_started = stats['solved'] - stats['warm_started']
+    cold_iterations = stats['iterations'] - stats['warm_started_iterations']
+    stats['mean_iterations'] = stats['iterations'] / stats['solved'] if stats['solved'] else 0.0
+    stats['mean_warm_iterations'] = \
+        stats['warm_started_iterations'] / stats['warm_started'] if stats['warm_started'] else 0.0
+    stats['mean_cold_iterations'] = cold_iterations / cold_started if cold_started else 0.0
+    return stats
+
+"""Returns yesterday's (or the last recent) IV of each option, NaN if none."""
+def _get_warm_start_ivs(underlying_symbols, option_roots, data_dates):
+    guesses = []
+    with _iv_state_lock:
+        for key, data_date in zip(zip(underlying_symbols, option_roots), data_dates):
+            previous = _previous_ivs.get(key)
+            if previous != None and 0 < (data_date - previous[0]).days <= WARM_START_MAX_DAYS:
+                guesses.append(previous[1])
+            else:
+                guesses.append(np.nan)
+    return np.array(guesses, dtype=np.float64)
+
+"""Remembers IVs for warm-starting later dates. Only usable IVs are kept."""
+def _remember_ivs(underlying_symbols, option_roots, data_dates, ivs):
+    with _iv_state_lock:
+        for key, data_date, iv in zip(zip(underlying_symbols, option_roots), data_dates, ivs):
+            if iv == None or not iv > .0001:
+                continue
+            previous = _previous_ivs.get(key)
+            if previous != None and previous[0] > data_date:
+                continue
+            _previous_ivs[key] = (data_date, float(iv))
+            _previous_ivs.move_to_end(key)
+        while len(_previous_ivs) > MAX_WARM_START_ROOTS:
+            _previous_ivs.popitem(last=False)
+
+"""Calculates IV and greeks for every row whose cached_greeks join came
+   back NULL, in one vectorized batch instead of one vollib call per option
+   and greek. Follows TransactionCandidate: the mid and years to expiration
+   are rounded the same way, greeks use the (rounded) IV, theta is per day,
+   vega is per 1% of vol and everything is rounded to 4 decimal places.
+   Returns a dict of row index -> (iv, delta, gamma, theta, vega)."""
+def _calculate_missing_greeks(transaction_candidates_tuple, indexes, money_rows):
+
+    # Find the rows with any greek missing.
+    missing = []
+    for index, money_values in zip(indexes, money_rows):
+        row = transaction_candidates_tuple[index]
+        for column in GREEK_COLUMN_INDEXES:
+            if row[column] == None:
+                missing.append((index, money_values, row))
+                break
+
+    # Cached IVs warm-start later dates too.
+    cached = [transaction_candidates_tuple[index] for index in indexes
+              if transaction_candidates_tuple[index][15] != None]
+    _remember_ivs([row[0] for row in cached], [row[3] for row in cached],
+                  [row[7] for row in cached], [row[15] for row in cached])
+    if len(missing) == 0:
+        return dict()
+
+    # Inputs, rounded as in TransactionCandidate.
+    underlying_prices = [money_values[0] for index, money_values, row in missing]
+    strikes = [money_values[1] for index, money_values, row in missing]
+    mids = [round((money_values[3] + money_values[4])/2, 2) for index, money_values, row in missing]
+    years_to_expiration = [max(round(float((row[6] - row[7]).days) / 365, 3), .001)
+                           for index, money_values, row in missing]
+    option_types = ['c' if row[5] == 'call' else 'p' for index, money_values, row in missing]
+    risk_free_rates = get_risk_free_rates([row[7] for index, money_values, row in missing],
+                                          years_to_expiration)
+
+    # IV, keeping cached values. Mirror the vollib wrapper: below intrinsic
+    # gives .0001, and anything else that fails the sanity check gives 0.
+    ivs = np.array([np.nan if row[15] == None else float(row[15]) for index, money_values, row in missing])
+    to_solve = np.isnan(ivs)
+    if to_solve.any():
+        solve_rows = [row for (index, money_values, row), solve in zip(missing, to_solve) if solve]
+        solve_keys = ([row[0] for row in solve_rows], [row[3] for row in solve_rows],
+                      [row[7] for row in solve_rows])
+        guesses = _get_warm_start_ivs(*solve_keys)
+        solved, status, iterations = implied_volatility_vec(np.array(mids)[to_solve],
+                                                            np.array(underlying_prices)[to_solve],
+                                                            np.array(strikes)[to_solve],
+                                                            np.array(years_to_expiration)[to_solve],
+                                                            risk_free_rates[to_solve],
+                                                            np.array(option_types)[to_solve],
+                                                            sig_high=1000.,
+                                                            sig_guess=guesses,
+                                                            return_iterations=True)
+        solved = np.where(status == IV_BELOW_INTRINSIC, .0001, solved)
+        solved = np.where((status == IV_CONVERGED) | (status == IV_BELOW_INTRINSIC), solved, 0.0)
+        solved = np.where((solved > 1000) | (solved < 0), 0.0, solved)
+        ivs[to_solve] = [round(iv, 4) for iv in solved.tolist()]
+        _remember_ivs(*solve_keys, ivs[to_solve].tolist())
+
+        # Statistics cover the options that went through the iterations;
+        # prices outside the no-arbitrage bounds are rejected up front.
+        iterated = iterations > 0
+        warm_started = iterated & ~np.isnan(guesses)
+        with _iv_state_lock:
+            _iv_solver_stats['solved'] += int(iterated.sum())
+            _iv_solver_stats['converged'] += int((status == IV_CONVERGED).sum())
+            _iv_solver_stats['iterations'] += int(iterations.sum())
+            _iv_solver_stats['warm_started'] += int(warm_started.sum())
+            _iv_solver_stats['warm_started_iterations'] += int(iterations[warm_started].sum())
+
+    # All greeks in one pass. main.greeks scales theta by 0.01 per year;
+    # vollib's theta is per day.
+    with np.errstate(all='ignore'):
+        batch = greeks(underlying_prices, strikes, years_to_expiration, risk_free_rates, ivs, option_types)
+    theta = batch['theta'] / 0.01 / 365
+
+    missing_greeks = dict()
+    for i, (index, money_values, row) in enumerate(missing):
+        missing_greeks[index] = (float(ivs[i]),
+                                 round(float(batch['delta'][i]), 4),
+                                 round(float(batch['gamma'][i]), 4),
+                                 round(float(theta[i]), 4),
+                                 round(float(batch['vega'][i]), 4))
+    return missing_greeks
+
+"""
+Returns symbols for all companies releasing earnings on the indicated date.
+Indicates whether the announcement is before or after market close (or neither).
+"""
+def get_upcoming_earnings(earnings_date):
+    return earnings_calendar.get_symbols_reporting_on(earnings_date)
 
 """Returns transaction candidates for a given date and symbol."""
 def get_transaction_candidates_by_date_and_symbol(
         underlying_symbol, earliest_date, latest_date, min_open_interest, earnings_date=None, max_bid_ask_spread=None, calculate_greeks=True):
 
+    transaction_candidates_tuple = _fetch_transaction_candidate_tuples(
+        underlying_symbol, earliest_date, latest_date, min_open_interest)
+    return _convert_to_transaction_candidates(transaction_candidates_tuple, earnings_date, max_bid_ask_spread, calculate_greeks)
+
+"""Returns the same options as get_transaction_candidates_by_date_and_symbol,
+   as a columnar OptionChain with derived values filled in. Greeks
+   missing from cached_greeks are calculated in one batch and cached,
+   as for TransactionCandidates."""
+def get_option_chain_by_date_and_symbol(
+        underlying_symbol, earliest_date, latest_date, min_open_interest, max_bid_ask_spread=None, calculate_greeks=True):
+
+    transaction_candidates_tuple = _fetch_transaction_candidate_tuples(
+        underlying_symbol, earliest_date, latest_date, min_open_interest)
+    option_chain = OptionChain.from_db_tuples(transaction_candidates_tuple)
+
+    # Error check.
+    usable = option_chain.underlying_price != 0
+
+    # Calculate the greeks missing from cached_greeks in one batch.
+    if calculate_greeks:
+        _fill_missing_greeks(option_chain, transaction_candidates_tuple, np.flatnonzero(usable).tolist())
+    option_chain = option_chain.filter(usable)
+
+    # Calculate derived data and filter for bid-ask spread.
+    option_chain.calculate_derived_values()
+    if max_bid_ask_spread:
+        option_chain = option_chain.filter(option_chain.bid_ask_spread <= max_bid_ask_spread)
+    return option_chain
+
+"""Calculates the greeks missing from the chain's rows at these indexes,
+   fills them into its greek columns and caches them."""
+def _fill_missing_greeks(option_chain, transaction_candidates_tuple, indexes):
+
+    money_columns = np.column_stack([option_chain.get_values(name) for name in MONEY_COLUMN_NAMES])
+    money_rows = money_columns[indexes].tolist() if len(indexes) > 0 else []
+    missing_greeks = _calculate_missing_greeks(transaction_candidates_tuple, indexes, money_rows)
+    if len(missing_greeks) == 0:
+        return
+
+    greek_columns = [option_chain.get_values(name) for name in GREEK_NAMES]
+    for index, calculated in missing_greeks.items():
+        row = transaction_candidates_tuple[index]
+
+        # Keep whatever was already cached.
+        values = []
+        for greek_column, column, value in zip(greek_columns, GREEK_COLUMN_INDEXES, calculated):
+            if row[column] == None:
+                greek_column[index] = value
+            values.append(value if row[column] == None else row[column])
+        store_greeks(row[7], row[3], row[0], *values)
+    for name, greek_column in zip(GREEK_NAMES, greek_columns):
+        option_chain.set_values(name, greek_column)
+
+"""Runs the option_prices/cached_greeks query and returns the raw rows,
+   ordered by data_date. If data_dates is given, it fetches those dates
+   instead of the earliest_date to latest_date range."""
+def _fetch_transaction_candidate_tuples(underlying_symbol, earliest_date, latest_date, min_open_interest, data_dates=None):
+
+    if _snapshot_store != None:
+        return _snapshot_store.get_transaction_candidate_tuples(
+            underlying_symbol, earliest_date, latest_date, min_open_interest, data_dates)
+
+    if data_dates != None:
+        date_condition = "o.data_date = ANY(%s)"
+        date_values = (list(data_dates),)
+    else:
+        date_condition = "o.data_date>=%s AND o.data_date<=%s"
+        date_values = (earliest_date, latest_date)
+
     connection = None
     try:
-        connection = psycopg2.connect(database='backtest_data')
+        connection = connection_pool.getconn()
         cursor = connection.cursor()
         cursor.execute("""SELECT 
                           o.underlying_symbol, 
@@ -243,26 +718,24 @@ def get_transaction_candidates_by_date_and_symbol(
                           o.underlying_symbol = g.underlying_symbol)
                           WHERE
                           o.underlying_symbol=%s AND 
-                          o.data_date>=%s AND
-                          o.data_date<=%s AND
-                          o.open_interest>=%s;""",
-                       (underlying_symbol,
-                        earliest_date,
-                        latest_date,
-                        min_open_interest))
+                          """ + date_condition + """ AND
+                          o.open_interest>=%s
+                          ORDER BY o.data_date;""",
+                       (underlying_symbol,) +
+                       date_values +
+                       (min_open_interest,))
 
         transaction_candidates_tuple = cursor.fetchall()
 
     except psycopg2.DatabaseError as e:
         if connection:
             connection.rollback()
-        print(e.message)
-        exit(1)
+        raise
     finally:
         if connection:
-            connection.close()
+            connection_pool.putconn(connection)
 
-    return _convert_to_transaction_candidates(transaction_candidates_tuple, earnings_date, max_bid_ask_spread, calculate_greeks)
+    return transaction_candidates_tuple
 
 """Decide if this underlying has weekly or just monthly options."""
 def only_monthly_options(underlying_symbol, data_date):
@@ -271,7 +744,7 @@ def only_monthly_options(underlying_symbol, data_date):
     connection = None
 
     try:
-        connection = psycopg2.connect(database='backtest_data')
+        connection = connection_pool.getconn()
         cursor = connection.cursor()
         cursor.execute("""SELECT DISTINCT option_root FROM option_prices WHERE
                           underlying_symbol=%s AND
@@ -282,10 +755,10 @@ def only_monthly_options(underlying_symbol, data_date):
     except psycopg2.DatabaseError as e:
         if connection:
             connection.rollback()
-        exit(1)
+        raise
     finally:
         if connection:
-            connection.close()
+            connection_pool.putconn(connection)
 
     expirations = set()
     for option_root in option_roots:
@@ -306,7 +779,21 @@ def only_monthly_options(underlying_symbol, data_date):
     print("Using monthly options.")
     return True # Monthlies
 
-"""Stores a new entry in the cached_greeks table."""
+# Greeks waiting to be written to cached_greeks, and the buffer size
+# at which store_greeks flushes them.
+GREEKS_FLUSH_SIZE = 1000
+_greeks_buffer = []
+_greeks_buffer_lock = threading.Lock()
+
+# Set in threads whose greeks are flushed by someone else (see load_many).
+_greeks_flush_deferred = threading.local()
+
+def _is_greeks_flush_deferred():
+    return getattr(_greeks_flush_deferred, 'active', False)
+
+"""Queues a new entry for the cached_greeks table. Entries are written
+   in bulk by flush_greeks once GREEKS_FLUSH_SIZE are queued, at the end
+   of load() or load_many() and at interpreter exit."""
 def store_greeks(data_date,
                  option_root,
                  underlying_symbol,
@@ -316,11 +803,46 @@ def store_greeks(data_date,
                  theta,
                  vega):
 
+    # Snapshots are read-only; greeks they lack are recalculated each run.
+    if _snapshot_store != None:
+        return
+
+    with _greeks_buffer_lock:
+        _greeks_buffer.append((data_date,
+                               option_root,
+                               underlying_symbol,
+                               iv,
+                               delta,
+                               gamma,
+                               theta,
+                               vega))
+        buffer_is_full = len(_greeks_buffer) >= GREEKS_FLUSH_SIZE
+    if buffer_is_full and not _is_greeks_flush_deferred():
+        flush_greeks()
+
+"""Writes all queued greeks with one multi-row INSERT per page. Rows
+   that are already cached keep their values; only their NULL greeks
+   are filled in."""
+def flush_greeks():
+
+    with _greeks_buffer_lock:
+        rows = list(_greeks_buffer)
+        del _greeks_buffer[:]
+    if len(rows) == 0:
+        return
+
+    # An upsert can't touch the same row twice; keep the first of each option.
+    first_rows = dict()
+    for row in rows:
+        first_rows.setdefault(row[:3], row)
+    rows = list(first_rows.values())
+
     connection = None
     try:
-        connection = psycopg2.connect(database='backtest_data')
+        connection = connection_pool.getconn()
         cursor = connection.cursor()
-        cursor.execute("""INSERT INTO cached_greeks (
+        execute_values(cursor,
+                       """INSERT INTO cached_greeks (
                           data_date, 
                           option_root, 
                           underlying_symbol, 
@@ -328,34 +850,25 @@ def store_greeks(data_date,
                           delta, 
                           gamma, 
                           theta, 
-                          vega) VALUES (
-                          %s,
-                          %s,
-                          %s,
-                          %s,
-                          %s,
-                          %s,
-                          %s,
-                          %s);""",
-                       (data_date,
-                        option_root,
-                        underlying_symbol,
-                        iv,
-                        delta,
-                        gamma,
-                        theta,
-                        vega))
+                          vega) VALUES %s
+                          ON CONFLICT (data_date, option_root, underlying_symbol) DO UPDATE SET
+                          iv = COALESCE(cached_greeks.iv, EXCLUDED.iv),
+                          delta = COALESCE(cached_greeks.delta, EXCLUDED.delta),
+                          gamma = COALESCE(cached_greeks.gamma, EXCLUDED.gamma),
+                          theta = COALESCE(cached_greeks.theta, EXCLUDED.theta),
+                          vega = COALESCE(cached_greeks.vega, EXCLUDED.vega);""",
+                       rows,
+                       page_size=GREEKS_FLUSH_SIZE)
         connection.commit()
-    except psycopg2.IntegrityError as ie:
-        if connection:
-            connection.rollback()
     except psycopg2.DatabaseError as e:
         if connection:
             connection.rollback()
-        exit(1)
+        raise
     finally:
         if connection:
-            connection.close()
+            connection_pool.putconn(connection)
+
+atexit.register(flush_greeks)
 
 """Returns n calendar days' worth of underlying prices."""
 def get_underlying_prices(underlying_symbol, date, num_days, return_dates=False):
@@ -363,6 +876,76 @@ def get_underlying_prices(underlying_symbol, date, num_days, return_dates=False)
     end_date = date
     start_date = end_date - datetime.timedelta(days=num_days)
 
+    if _snapshot_store != None:
+        prices_by_date = _snapshot_store.get_underlying_prices(underlying_symbol, start_date, end_date)
+    else:
+        prices_by_date = _get_underlying_price_series(underlying_symbol, start_date, end_date)
+
+    # Only return a list of prices.
+    if not return_dates:
+        prices = []
+        date = start_date
+        while date <= end_date:
+            if date in prices_by_date.keys():
+                prices.append(prices_by_date[date])
+            date += datetime.timedelta(days=1)
+        return prices
+    else:
+        return prices_by_date
+
+# Underlying prices already loaded, per symbol: a dict of date -> price
+# and the sorted, disjoint (start_date, end_date) ranges it covers.
+_underlying_price_series = dict()
+_underlying_price_series_lock = threading.Lock()
+
+"""Returns a dict of date -> underlying price for start_date to end_date,
+   only going to the DB for the parts of the range not loaded before."""
+def _get_underlying_price_series(underlying_symbol, start_date, end_date):
+
+    with _underlying_price_series_lock:
+        prices, ranges = _underlying_price_series.setdefault(underlying_symbol, (dict(), []))
+        gaps = _get_uncovered_ranges(ranges, start_date, end_date)
+
+    for gap_start, gap_end in gaps:
+        gap_prices = _get_underlying_prices_from_db(underlying_symbol, gap_start, gap_end)
+        with _underlying_price_series_lock:
+            prices.update(gap_prices)
+            ranges.append((gap_start, gap_end))
+            ranges[:] = _merge_ranges(ranges)
+
+    with _underlying_price_series_lock:
+        return {date: price for date, price in prices.items() if start_date <= date <= end_date}
+
+"""Returns the parts of [start_date, end_date] outside the sorted,
+   disjoint ranges."""
+def _get_uncovered_ranges(ranges, start_date, end_date):
+    gaps = []
+    for range_start, range_end in ranges:
+        if range_end < start_date:
+            continue
+        if range_start > end_date:
+            break
+        if range_start > start_date:
+            gaps.append((start_date, range_start - datetime.timedelta(days=1)))
+        start_date = max(start_date, range_end + datetime.timedelta(days=1))
+    if start_date <= end_date:
+        gaps.append((start_date, end_date))
+    return gaps
+
+"""Sorts ranges and merges the ones that overlap or touch."""
+def _merge_ranges(ranges):
+    merged = []
+    for range_start, range_end in sorted(ranges):
+        if merged and range_start <= merged[-1][1] + datetime.timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+        else:
+            merged.append((range_start, range_end))
+    return merged
+
+"""Returns a dict of date -> underlying price from cached_prices, filling
+   in the trading dates it is missing from option_prices."""
+def _get_underlying_prices_from_db(underlying_symbol, start_date, end_date):
+
     # Load market holidays file.
     market_holidays_file = import_module('market_holidays.py'.replace('.py', ''))
     market_holidays = market_holidays_file.market_holidays
@@ -378,7 +961,7 @@ def get_underlying_prices(underlying_symbol, date, num_days, return_dates=False)
 
     # Set up the DB.
     connection = None
-    connection = psycopg2.connect(database='backtest_data')
+    connection = connection_pool.getconn()
     cursor = connection.cursor()
     
     try:
@@ -389,63 +972,65 @@ def get_underlying_prices(underlying_symbol, date, num_days, return_dates=False)
                        (start_date, end_date, underlying_symbol))
         price_tuples = cursor.fetchall()
         prices_by_date = dict()
-        for price, date in price_tuples:
+        parsed_prices = parse_money([price for price, date in price_tuples])
+        for parsed_price, (price, date) in zip(parsed_prices.tolist(), price_tuples):
             if price == None:
                 continue
-            prices_by_date[date] = float(price.replace('$', '').replace(',', ''))
-
-        # Get the missing dates.
-        missing_dates = trading_dates.difference(prices_by_date.keys())
+            prices_by_date[date] = parsed_price
+
+        # Get the missing dates, all in one query.
+        missing_dates = sorted(trading_dates.difference(prices_by_date.keys()))
+        price_tuples_by_date = dict()
+        if len(missing_dates) > 0:
+            cursor.execute("""SELECT underlying_price, data_date FROM
+                              option_prices WHERE data_date = ANY(%s)
+                              AND underlying_symbol=%s
+                              GROUP BY data_date, underlying_price;""",
+                           (missing_dates, underlying_symbol))
+            for price, date in cursor.fetchall():
+                price_tuples_by_date.setdefault(date, []).append(price)
+
+        new_prices = []
         for date in missing_dates:
-            cursor.execute("""SELECT DISTINCT underlying_price, data_date FROM 
-                              option_prices WHERE data_date=%s
-                              AND underlying_symbol=%s;""",
-                           (date, underlying_symbol))
-            price_tuples = cursor.fetchall()
+            prices = price_tuples_by_date.get(date, [])
 
             # Error check.
-            if len(price_tuples) > 1:
+            if len(prices) > 1:
                 print("ERROR: multiple prices in option_prices: " + str(date) + " " + underlying_symbol)
-            for price, date in price_tuples:
+            for price in prices:
                 if price == None:
                     continue
-                prices_by_date[date] = float(price.replace('$', '').replace(',', ''))
+                prices_by_date[date] = parse_money_value(price)
 
             # If we are missing a price for a trading date, something is wrong.
-            if len(price_tuples) == 0:
+            if len(prices) == 0:
                 print("********************")
                 print("WARNING: no price data for trading date: " + str(date) + " " + underlying_symbol)
                 print("********************")
             else:
-                # Insert into the cache.
-                cursor.execute("""INSERT INTO cached_prices (
+                new_prices.append((date, underlying_symbol, price))
+
+        # Insert into the cache.
+        if len(new_prices) > 0:
+            execute_values(cursor,
+                           """INSERT INTO cached_prices (
                               data_date,
                               underlying_symbol,
-                              underlying_price) VALUES (
-                              %s,
-                              %s,
-                              %s);""", (date, underlying_symbol, price))
-                connection.commit()
+                              underlying_price) VALUES %s
+                              ON CONFLICT DO NOTHING;""",
+                           new_prices,
+                           page_size=len(new_prices))
+            connection.commit()
 
     except psycopg2.DatabaseError as e:
         if connection:
             connection.rollback()
-        exit(1)
+        raise
     finally:
         if connection:
-            connection.close()
+            connection_pool.putconn(connection)
 
-    # Only return a list of prices.
-    if not return_dates:
-        prices = []
-        date = start_date
-        while date <= end_date:
-            if date in prices_by_date.keys():
-                prices.append(prices_by_date[date])
-            date += datetime.timedelta(days=1)
-        return prices
-    else:
-        return prices_by_date
+    return prices_by_date
 
 """Returns the underlying move for the last earnings date."""
 def get_earnings_move(underlying_symbol, earnings_date, before_or_after=None):
@@ -470,7 +1055,7 @@ def get_earnings_move(underlying_symbol, earnings_date, before_or_after=None):
  
     connection = None
     try:
-        connection = psycopg2.connect(database='backtest_data')
+        connection = connection_pool.getconn()
         cursor = connection.cursor()
 
         # Before earnings price.
@@ -483,7 +1068,7 @@ def get_earnings_move(underlying_symbol, earnings_date, before_or_after=None):
         # If we have no data, return 0.
         if before_price_tuple == None or len(before_price_tuple) == 0:
             return 0.0
-        before_price = float(before_price_tuple[0].replace('$', '').replace(',', ''))
+        before_price = parse_money_value(before_price_tuple[0])
         
         # After earnings price.
         cursor.execute("""SELECT underlying_price FROM option_prices
@@ -495,54 +1080,97 @@ def get_earnings_move(underlying_symbol, earnings_date, before_or_after=None):
         # If we have no data, return 0.
         if after_price_tuple == None or len(after_price_tuple) == 0:
             return 0.0
-        after_price = float(after_price_tuple[0].replace('$', '').replace(',', ''))
+        after_price = parse_money_value(after_price_tuple[0])
 
     except psycopg2.DatabaseError:
         if connection:
             connection.rollback()
-        exit(1)
+        raise
     finally:
         if connection:
-            connection.close()
+            connection_pool.putconn(connection)
 
     # Calculate the change and return.
     earnings_move = (after_price - before_price)/before_price
     return earnings_move
         
 """Returns the mid of a given option on a given date."""
-def get_mid(option_root, date):
+def get_mid(option_root, date, underlying_symbol=None):
+    underlying_symbols = {option_root: underlying_symbol} if underlying_symbol != None else None
+    return get_mids([(option_root, date)], underlying_symbols)[(option_root, date)]
+
+# Mids already looked up, keyed by (option_root, date), least recently
+# used first. None is cached too, for options with no price that day.
+MAX_CACHED_MIDS = 200000
+_mid_cache = OrderedDict()
+_mid_cache_lock = threading.Lock()
+
+"""Returns a dict of (option_root, date) -> mid (None if there is no
+   price) for many options at once. Pairs that are not cached are
+   looked up in a single query. underlying_symbols, a dict of
+   option_root -> underlying symbol, saves snapshot mode from
+   searching every symbol for the roots it names."""
+def get_mids(option_roots_and_dates, underlying_symbols=None):
+
+    mids = dict()
+    missing = []
+    with _mid_cache_lock:
+        for key in option_roots_and_dates:
+            if key in _mid_cache:
+                _mid_cache.move_to_end(key)
+                mids[key] = _mid_cache[key]
+            elif key not in mids:
+                mids[key] = None
+                missing.append(key)
+    if len(missing) == 0:
+        return mids
+
+    if _snapshot_store != None:
+        for option_root, date in missing:
+            underlying_symbol = underlying_symbols.get(option_root) if underlying_symbols != None else None
+            mids[(option_root, date)] = _snapshot_store.get_mid(option_root, date, underlying_symbol)
+    else:
+        connection = None
+        try:
+            connection = connection_pool.getconn()
+            cursor = connection.cursor()
+            bid_ask_tuples = execute_values(cursor,
+                                            """SELECT o.option_root, o.data_date, o.bid, o.ask
+                                               FROM option_prices o
+                                               JOIN (VALUES %s) AS wanted (option_root, data_date) ON
+                                               (o.option_root = wanted.option_root AND
+                                               o.data_date = wanted.data_date);""",
+                                            missing,
+                                            page_size=len(missing),
+                                            fetch=True)
+        except psycopg2.DatabaseError:
+            if connection:
+                connection.rollback()
+            raise
+        finally:
+            if connection:
+                connection_pool.putconn(connection)
+
+        # Keep the first row of each option, as get_mid did.
+        found = set()
+        bid_ask = parse_money([money for row in bid_ask_tuples for money in row[2:]]).tolist()
+        for i, (option_root, data_date, bid, ask) in enumerate(bid_ask_tuples):
+            if (option_root, data_date) in found:
+                continue
+            found.add((option_root, data_date))
+            mids[(option_root, data_date)] = round((bid_ask[2*i] + bid_ask[2*i + 1])/2, 2)
 
-    connection = None
-    try:
-        connection = psycopg2.connect(database='backtest_data')
-        cursor = connection.cursor()
-        cursor.execute("""SELECT bid, ask FROM option_prices
-                          WHERE option_root=%s AND
-                          data_date=%s;""",
-                       (option_root, date))
-        bid_ask_tuple = cursor.fetchone()
-        if bid_ask_tuple == None or len(bid_ask_tuple) == 0:
-            return None
-        bid = float(bid_ask_tuple[0].replace('$', '').replace(',', ''))
-        ask = float(bid_ask_tuple[1].replace('$', '').replace(',', ''))
-        mid = round((bid + ask)/2, 2)
-    except psycopg2.DatabaseError:
-        if connection:
-            connection.rollback()
-        exit(1)
-    finally:
-        if connection:
-            connection.close()
-    return mid
+    with _mid_cache_lock:
+        for key in missing:
+            _mid_cache[key] = mids[key]
+        while len(_mid_cache) > MAX_CACHED_MIDS:
+            _mid_cache.popitem(last=False)
+    return mids
 
 """Returns the date of the next earnings, or None if there is none."""
 def get_next_earnings(symbol, current_date):
+    return earnings_calendar.get_next_earnings(symbol, current_date)
 
-    earnings_dates = get_earnings_dates(symbol)
-    earnings_dates.sort()
-    for earnings_date in earnings_dates:
-        if earnings_date >= current_date:
-            return earnings_date
-    return None
-
-
+# Snapshot mode can also be turned on from the environment.
+if os.environ.get('BACKTEST_SNAPSHOT_DIR'):
+    use_snapshots(os.environ['BACKTEST_SNAPSHOT_DIR'])
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Measures the per-object memory of the slot-based
+TransactionCandidate, Transaction and Trade against
+__dict__-based objects holding the same attributes
+(which is what these classes used to be).
+"""
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+import load_trades
+import datetime
+import tracemalloc
+from types import SimpleNamespace
+from TransactionCandidate import TransactionCandidate
+from Transaction import Transaction
+from Trade import Trade
+
+NUM_OBJECTS = 100000
+
+"""Returns a fake option_prices/cached_greeks row."""
+def make_row(i):
+    data_date = datetime.date(2017, 1, 3)
+    return ('SPY',
+            '$225.0' + str(i % 10),
+            'X',
+            'SPY170217P' + str(200000 + i),
+            None,
+            'put',
+            data_date + datetime.timedelta(days=45),
+            data_date,
+            '$' + str(200 + i % 50) + '.00',
+            '$1.10',
+            '$1.05',
+            '$1.15',
+            100,
+            1000,
+            900,
+            .1 + i % 7 / 100,
+            -.3,
+            .02,
+            -.05,
+            .2)
+
+"""Returns the bytes allocated per object by factory."""
+def measure(factory):
+    tracemalloc.start()
+    objects = [factory(i) for i in range(NUM_OBJECTS)]
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return allocated / NUM_OBJECTS
+
+"""A TransactionCandidate with its derived values filled in."""
+def make_candidate(i):
+    candidate = TransactionCandidate(make_row(i))
+    candidate.rel_value, candidate.rel_strike, candidate.bid_ask_spread
+    return candidate
+
+"""The same data held in a __dict__."""
+def make_dict_candidate(i):
+    candidate = make_candidate(i)
+    names = [name.lstrip('_') for name in TransactionCandidate.__slots__]
+    return SimpleNamespace(RISK_FREE_RATE=.011, **{name: getattr(candidate, name) for name in names})
+
+def make_transaction(i):
+    transaction = Transaction()
+    transaction.buy_or_sell = 'buy'
+    return transaction
+
+def make_dict_transaction(i):
+    return SimpleNamespace(stats=None, buy_or_sell='buy')
+
+def make_trade(i):
+    return Trade()
+
+def make_dict_trade(i):
+    trade = Trade()
+    return SimpleNamespace(**{name: getattr(trade, name) for name in Trade.__slots__})
+
+for name, slot_factory, dict_factory in (('TransactionCandidate', make_candidate, make_dict_candidate),
+                                         ('Transaction', make_transaction, make_dict_transaction),
+                                         ('Trade', make_trade, make_dict_trade)):
+    slot_bytes = measure(slot_factory)
+    dict_bytes = measure(dict_factory)
+    print(name + ": " + str(round(slot_bytes)) + " bytes with __slots__, " +
+          str(round(dict_bytes)) + " bytes with __dict__ (" +
+          str(round(100 * (1 - slot_bytes / dict_bytes))) + "% saved)")
@@ -0,0 +1,119 @@
+"""
+Scenario-grid risk for open trades. Every leg of every
+trade is repriced under each combination of spot move,
+IV shift and elapsed days in one broadcast call.
+"""
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+import load_trades
+import numpy as np
+from BlackScholes.main import bs_price_vec, implied_volatility_vec, IV_CONVERGED
+
+# Contract multiplier; trade values elsewhere are per share.
+CONTRACT_MULTIPLIER = 100
+
+# Smallest time to expiration used when a shock runs past expiration,
+# so the price collapses to intrinsic value.
+MIN_YEARS_TO_EXPIRATION = 1e-6
+
+"""Returns P/L cubes for a list of open Trades.
+
+   spot_shocks are relative moves in the underlying (-.1 is down 10%),
+   vol_shocks are absolute IV shifts (.05 is +5 vol points) and
+   day_shocks are calendar days elapsed from current_date.
+   underlying_prices optionally maps symbol -> current price; otherwise
+   each leg's own underlying_price is used.
+
+   Legs without an IV (e.g. loaded with calculate_greeks=False) have
+   it solved, in one batch, from their own mid, underlying price and
+   data date. A leg whose IV doesn't solve isn't dropped, which would
+   misstate its trade's risk; its trade's P/L is NaN instead, and so
+   is the total.
+
+   Returns a dict with:
+     'trades': array (n_trades, n_spot, n_vol, n_days) of dollar P/L
+     'total':  array (n_spot, n_vol, n_days), summed over trades"""
+def get_scenario_pl(trades,
+                    current_date,
+                    spot_shocks,
+                    vol_shocks,
+                    day_shocks,
+                    underlying_prices=None):
+
+    spot_shocks = np.asarray(spot_shocks, dtype=np.float64)
+    vol_shocks = np.asarray(vol_shocks, dtype=np.float64)
+    day_shocks = np.asarray(day_shocks, dtype=np.float64)
+
+    # Flatten every leg of every trade into columns.
+    trade_index = []
+    spot = []
+    strike = []
+    days_to_expiration = []
+    iv = []
+    option_type = []
+    position = []
+    unsolved_legs = []
+    for i, trade in enumerate(trades):
+        num_contracts = trade.num_contracts if trade.num_contracts != None else 1
+        for leg in trade.opening_transactions:
+            stats = leg.stats
+            trade_index.append(i)
+            if underlying_prices and stats.underlying_symbol in underlying_prices:
+                spot.append(underlying_prices[stats.underlying_symbol])
+            else:
+                spot.append(stats.underlying_price)
+            strike.append(stats.strike)
+            days_to_expiration.append((stats.expiration - current_date).days)
+            if stats.iv != None:
+                iv.append(float(stats.iv))
+            else:
+                iv.append(np.nan)
+                unsolved_legs.append((len(iv) - 1, stats))
+            option_type.append(stats.option_type)
+            sign = 1 if leg.buy_or_sell == 'buy' else -1
+            position.append(sign * num_contracts * CONTRACT_MULTIPLIER)
+
+    if len(unsolved_legs) > 0:
+        solved = _solve_ivs([stats for leg_index, stats in unsolved_legs])
+        for (leg_index, stats), leg_iv in zip(unsolved_legs, solved.tolist()):
+            iv[leg_index] = leg_iv
+
+    grid_shape = (spot_shocks.size, vol_shocks.size, day_shocks.size)
+    if len(trade_index) == 0:
+        return {'trades': np.zeros((0,) + grid_shape), 'total': np.zeros(grid_shape)}
+
+    # Leg axis first, then spot, vol and days.
+    spot, strike, days_to_expiration, iv, position = [
+        np.asarray(column, dtype=np.float64)[:, None, None, None]
+        for column in (spot, strike, days_to_expiration, iv, position)]
+    option_type = np.asarray(option_type)[:, None, None, None]
+
+    base_years = np.maximum(days_to_expiration / 365, MIN_YEARS_TO_EXPIRATION)
+    rate = load_trades.get_risk_free_rates(current_date, base_years)
+    base_value = bs_price_vec(spot, strike, base_years, rate, iv, option_type)
+
+    shocked_spot = spot * (1 + spot_shocks[None, :, None, None])
+    shocked_iv = np.maximum(iv + vol_shocks[None, None, :, None], 1e-4)
+    shocked_years = np.maximum((days_to_expiration - day_shocks[None, None, None, :]) / 365,
+                               MIN_YEARS_TO_EXPIRATION)
+    shocked_value = bs_price_vec(shocked_spot, strike, shocked_years, rate, shocked_iv, option_type)
+
+    leg_pl = position * (shocked_value - base_value)
+
+    # Sum legs into their trades.
+    trade_pl = np.zeros((len(trades),) + grid_shape)
+    np.add.at(trade_pl, np.asarray(trade_index), leg_pl)
+    return {'trades': trade_pl, 'total': trade_pl.sum(axis=0)}
+
+"""Returns the IVs of these legs' stats solved from their mids, NaN
+   where the solver doesn't converge."""
+def _solve_ivs(leg_stats):
+    years_to_expiration = [max(round(float((stats.expiration - stats.data_date).days) / 365, 3), .001)
+                           for stats in leg_stats]
+    solved, status = implied_volatility_vec([stats.mid for stats in leg_stats],
+                                            [stats.underlying_price for stats in leg_stats],
+                                            [stats.strike for stats in leg_stats],
+                                            years_to_expiration,
+                                            [stats.get_risk_free_rate() for stats in leg_stats],
+                                            [stats.option_type for stats in leg_stats])
+    return np.where(status == IV_CONVERGED, solved, np.nan)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Local columnar snapshots of option_prices joined with
+cached_greeks, one partition per symbol and year, so backtests
+can run without the database. A partition is a directory of
+.npy files, one per column, sorted by data_date and option_root;
+the columns are memory-mapped, so a backtest only pages in the
+dates it reads. Exporting with --compress writes one compressed
+.npz per partition instead, which is several times smaller but
+has to be read into memory whole when opened.
+
+Run with --help for the export options. load_trades.use_snapshots()
+(or the BACKTEST_SNAPSHOT_DIR environment variable) switches the
+loaders over to the snapshots.
+"""
+from os import sys, path
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+import load_trades
+import argparse
+import datetime
+import os
+import threading
+import numpy as np
+from OptionChain import OptionChain, DB_COLUMNS, to_day_numbers, from_day_numbers, from_fixed_point
+
+# Constants.
+SNAPSHOT_DIR = path.join(path.dirname(path.abspath(__file__)), 'snapshots')
+COMPRESSED_FILE = 'columns.npz'
+CATEGORIES_SUFFIX = '.categories'
+
+"""Writes the snapshot partition of one symbol and year. Returns the
+   number of options written."""
+def export_snapshot(underlying_symbol, year, directory=SNAPSHOT_DIR, compress=False):
+
+    underlying_symbol = underlying_symbol.upper()
+    transaction_candidates_tuple = load_trades._fetch_transaction_candidate_tuples(
+        underlying_symbol, datetime.date(year, 1, 1), datetime.date(year, 12, 31), 0)
+    if len(transaction_candidates_tuple) == 0:
+        return 0
+    option_chain = OptionChain.from_db_tuples(transaction_candidates_tuple).sort('option_root', 'data_date')
+
+    # One array per DB column, plus the category table of each string column.
+    arrays = dict()
+    for name, kind in DB_COLUMNS:
+        arrays[name] = option_chain.columns[name]
+        if name in option_chain.categories:
+            arrays[name + CATEGORIES_SUFFIX] = option_chain.categories[name]
+
+    partition = path.join(directory, underlying_symbol, str(year))
+    os.makedirs(partition, exist_ok=True)
+    if compress:
+        np.savez_compressed(path.join(partition, COMPRESSED_FILE), **arrays)
+    else:
+        for name, array in arrays.items():
+            np.save(path.join(partition, name + '.npy'), array)
+    return len(option_chain)
+
+class SnapshotPartition:
+
+    """Open the partition in this directory."""
+    def __init__(self, partition):
+        compressed_file = path.join(partition, COMPRESSED_FILE)
+        if path.exists(compressed_file):
+            with np.load(compressed_file) as arrays:
+                arrays = {name: arrays[name] for name in arrays.files}
+        else:
+            arrays = {file_name[:-len('.npy')]: np.load(path.join(partition, file_name), mmap_mode='r')
+                      for file_name in os.listdir(partition) if file_name.endswith('.npy')}
+        self.columns = {name: arrays[name] for name, kind in DB_COLUMNS}
+        self.categories = {name[:-len(CATEGORIES_SUFFIX)]: array for name, array in arrays.items()
+                           if name.endswith(CATEGORIES_SUFFIX)}
+
+    """Returns the slice of rows on data dates from earliest_date to latest_date."""
+    def _get_date_range(self, earliest_date, latest_date):
+        data_dates = self.columns['data_date']
+        low = np.searchsorted(data_dates, to_day_numbers(earliest_date), side='left')
+        high = np.searchsorted(data_dates, to_day_numbers(latest_date), side='right')
+        return low, high
+
+    """Returns rows in the layout of the option_prices/cached_greeks
+       query, for data dates in [earliest_date, latest_date] (and in
+       data_dates, if given) with at least min_open_interest."""
+    def get_rows(self, earliest_date, latest_date, min_open_interest, data_dates=None):
+
+        low, high = self._get_date_range(earliest_date, latest_date)
+        keep = np.asarray(self.columns['open_interest'][low:high]) >= min_open_interest
+        if data_dates != None:
+            keep &= np.isin(self.columns['data_date'][low:high], to_day_numbers(sorted(data_dates)))
+        indexes = low + np.flatnonzero(keep)
+
+        option_chain = OptionChain({name: np.asarray(column[indexes]) for name, column in self.columns.items()},
+                                   self.categories)
+        return option_chain.to_db_tuples()
+
+    """Returns the mid of this option on this date, or None."""
+    def get_mid(self, option_root, date):
+        roots = self.categories['option_root']
+        option_root = option_root.encode()
+        code = np.searchsorted(roots, option_root)
+        if code == len(roots) or roots[code] != option_root:
+            return None
+        low, high = self._get_date_range(date, date)
+        index = low + np.searchsorted(self.columns['option_root'][low:high], code)
+        if index == high or self.columns['option_root'][index] != code:
+            return None
+        bid, ask = from_fixed_point([self.columns['bid'][index], self.columns['ask'][index]], 'money').tolist()
+        return round((bid + ask)/2, 2)
+
+    """Returns a dict of data_date -> underlying price."""
+    def get_underlying_prices(self, earliest_date, latest_date):
+        low, high = self._get_date_range(earliest_date, latest_date)
+        data_dates, first_rows = np.unique(self.columns['data_date'][low:high], return_index=True)
+        data_dates = from_day_numbers(data_dates)
+        prices = from_fixed_point(np.asarray(self.columns['underlying_price'][low:high])[first_rows], 'money')
+        return {data_date: price for data_date, price in zip(data_dates.tolist(), prices.tolist())
+                if price == price and price != 0}
+
+class SnapshotStore:
+
+    """Serves the loaders from the snapshots under directory. Partitions
+       are opened on first use."""
+    def __init__(self, directory=SNAPSHOT_DIR):
+        self.directory = directory
+        self._partitions = dict()
+        self._symbols_by_root = dict()
+        self._indexed_years = set()
+        self._lock = threading.Lock()
+
+    """Returns the partition of this symbol and year, or None if there is none."""
+    def _get_partition(self, underlying_symbol, year):
+        key = (underlying_symbol.upper(), year)
+        with self._lock:
+            if key not in self._partitions:
+                partition = path.join(self.directory, key[0], str(year))
+                self._partitions[key] = SnapshotPartition(partition) if path.isdir(partition) else None
+            return self._partitions[key]
+
+    def _get_partitions(self, underlying_symbol, earliest_date, latest_date):
+        partitions = [self._get_partition(underlying_symbol, year)
+                      for year in range(earliest_date.year, latest_date.year + 1)]
+        return [partition for partition in partitions if partition != None]
+
+    """Same as load_trades._fetch_transaction_candidate_tuples."""
+    def get_transaction_candidate_tuples(self, underlying_symbol, earliest_date, latest_date,
+                                         min_open_interest, data_dates=None):
+        if data_dates != None:
+            if len(data_dates) == 0:
+                return []
+            earliest_date, latest_date = min(data_dates), max(data_dates)
+        rows = []
+        for partition in self._get_partitions(underlying_symbol, earliest_date, latest_date):
+            rows.extend(partition.get_rows(earliest_date, latest_date, min_open_interest, data_dates))
+        return rows
+
+    """Returns the mid of this option on this date, or None. Pass the
+       underlying symbol if it is known; otherwise it is looked up in
+       an index of the option roots of every symbol that year."""
+    def get_mid(self, option_root, date, underlying_symbol=None):
+        if underlying_symbol == None:
+            underlying_symbol = self._get_symbol_of_root(option_root, date.year)
+            if underlying_symbol == None:
+                return None
+        partition = self._get_partition(underlying_symbol, date.year)
+        return partition.get_mid(option_root, date) if partition != None else None
+
+    """Returns the symbol of this option root, indexing the roots of
+       every symbol's partition for the year the first time it is needed,
+       or None if no symbol has the root."""
+    def _get_symbol_of_root(self, option_root, year):
+        with self._lock:
+            indexed = year in self._indexed_years
+        if not indexed:
+            symbols = os.listdir(self.directory) if path.isdir(self.directory) else []
+            for underlying_symbol in sorted(symbols):
+                partition = self._get_partition(underlying_symbol, year)
+                if partition == None:
+                    continue
+                roots = partition.categories['option_root'].astype(np.str_).tolist()
+                with self._lock:
+                    for root in roots:
+                        self._symbols_by_root.setdefault(root, underlying_symbol)
+            with self._lock:
+                self._indexed_years.add(year)
+        with self._lock:
+            return self._symbols_by_root.get(option_root)
+
+    """Returns a dict of data_date -> underlying price for this symbol."""
+    def get_underlying_prices(self, underlying_symbol, earliest_date, latest_date):
+        prices_by_date = dict()
+        for partition in self._get_partitions(underlying_symbol, earliest_date, latest_date):
+            prices_by_date.update(partition.get_underlying_prices(earliest_date, latest_date))
+        return prices_by_date
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='Export option_prices snapshots.')
+    argument_parser.add_argument('start_year', type=int)
+    argument_parser.add_argument('end_year', type=int)
+    argument_parser.add_argument('symbols', nargs='+')
+    argument_parser.add_argument('-d', '--directory', default=SNAPSHOT_DIR)
+    argument_parser.add_argument('--compress', action='store_true')
+    args = argument_parser.parse_args()
+
+    for symbol in args.symbols:
+        for year in range(args.start_year, args.end_year + 1):
+            num_options = export_snapshot(symbol, year, args.directory, args.compress)
+            print(symbol.upper() + " " + str(year) + ": " + str(num_options) + " options")
+
+if __name__ == "__main__":
+    main()